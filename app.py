@@ -1,28 +1,44 @@
 from __future__ import annotations
 
+import hashlib
+import json
 import os
 import string
-import tempfile
+import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from io import BytesIO
 from pathlib import Path
 from typing import Optional
 
 import streamlit as st
 from dotenv import load_dotenv
+from PIL import Image
 
 from video_pipeline.config import (
     describe_api_mode,
     get_default_config,
     get_genai_client,
+    image_cache_dir,
     is_real_api_enabled,
     make_run_directory,
     use_fake_genai,
 )
 from video_pipeline.fake_genai import FakeGenaiClient
-from video_pipeline.images import regenerate_storyboard_images
-from video_pipeline.run_pipeline import build_video_from_frames
+from video_pipeline.io_utils import save_uploaded_file
 
+# Mirrors server.maxUploadSize in .streamlit/config.toml for deployments that override it.
+MAX_REF_UPLOAD_BYTES = 16 * 1024 * 1024
 
-load_dotenv()
+
+@st.cache_resource
+def _init_env() -> bool:
+    """Parse .env once per process instead of on every script rerun."""
+    load_dotenv()
+    return True
+
+
+_init_env()
 
 st.set_page_config(page_title="AIアニメーションビルダー", layout="centered")
 st.title("AIアニメーションビルダー")
@@ -33,12 +49,17 @@ st.markdown(
 )
 
 
-def _save_uploaded_file(upload) -> Path:
-    suffix = Path(upload.name).suffix or ".png"
-    temp_dir = Path(tempfile.mkdtemp(prefix="ref_image_"))
-    target = temp_dir / f"reference{suffix}"
-    target.write_bytes(upload.read())
-    return target
+def _sync_ref_upload(upload) -> None:
+    """Write a new upload to disk once; session state keeps only its path and identity."""
+    if upload is None:
+        state.ref_path = None
+        state.ref_upload_id = None
+        return
+    # file_id changes on every upload, even for a same-named, same-sized replacement image.
+    upload_id = upload.file_id
+    if state.ref_path is None or state.ref_upload_id != upload_id:
+        state.ref_path = save_uploaded_file(upload)
+        state.ref_upload_id = upload_id
 
 
 state = st.session_state
@@ -46,8 +67,13 @@ state.setdefault("run_dir", None)
 state.setdefault("prompts_data", None)
 state.setdefault("frame_paths", None)
 state.setdefault("final_video_path", None)
+state.setdefault("video_future", None)
+state.setdefault("video_build_key", None)
+state.setdefault("video_cancel", None)
+state.setdefault("video_progress", None)
 state.setdefault("selected_frames", [])
 state.setdefault("ref_path", None)
+state.setdefault("ref_upload_id", None)
 state.setdefault("use_fake_mode", use_fake_genai())
 state.setdefault("frames", [{"id": "A", "prompt": ""}, {"id": "B", "prompt": ""}])
 
@@ -58,20 +84,32 @@ def _reset_generation_state() -> None:
         prompts_data=None,
         frame_paths=None,
         final_video_path=None,
+        video_future=None,
+        video_build_key=None,
+        video_cancel=None,
+        video_progress=None,
         selected_frames=[],
         ref_path=None,
+        ref_upload_id=None,
     )
 
 
-def _select_client(use_fake: bool):
-    if is_real_api_enabled():
+@st.cache_resource
+def _build_client(use_fake: bool, real_enabled: bool):
+    """Create the GenAI client once per mode and share it across reruns/sessions."""
+    if real_enabled:
         return get_genai_client()
     if use_fake:
-        os.environ["USE_FAKE_GENAI"] = "1"
         return FakeGenaiClient()
     return None
 
 
+def _select_client(use_fake: bool):
+    # No USE_FAKE_GENAI side effect: the flag is process-wide and would outlive a switch to real
+    # mode. Pipeline code detects the fake client itself via is_fake_client().
+    return _build_client(use_fake, is_real_api_enabled())
+
+
 def _render_mode_badge():
     mode = describe_api_mode()
     if mode == "real":
@@ -88,47 +126,134 @@ _render_mode_badge()
 
 real_enabled = is_real_api_enabled()
 if not real_enabled:
-    state.use_fake_mode = st.checkbox(
-        "オフラインデモ（フェイク出力を使用）", value=state.use_fake_mode
-    )
+    # Keyed widgets read/write session state directly, so reruns never reset them.
+    st.checkbox("オフラインデモ（フェイク出力を使用）", key="use_fake_mode")
     if not state.use_fake_mode:
         st.info("実APIを使う場合は ENABLE_REAL_GENAI=1 をセットしてください。")
 
-ref_file = st.file_uploader("参考画像（任意）", type=["png", "jpg", "jpeg"])
+ref_file = st.file_uploader("参考画像（任意）", type=["png", "jpg", "jpeg"], key="ref_file")
+if ref_file is not None and ref_file.size > MAX_REF_UPLOAD_BYTES:
+    st.error(f"参考画像が大きすぎます（上限 {MAX_REF_UPLOAD_BYTES >> 20}MB）。")
+    ref_file = None
 
 
 def _ensure_run_dir():
     if state.run_dir is None:
-        cfg = get_default_config()
-        state.run_dir = make_run_directory(cfg)
+        state.run_dir = make_run_directory(get_default_config())
+
+
+def _frame_cache_dir() -> Path:
+    # Shared across runs: entries are keyed by content, so a new run with unchanged frames reuses them.
+    return image_cache_dir(get_default_config())
+
+
+@st.cache_data(max_entries=256)
+def _thumbnail(path: str, mtime: float, max_side: int) -> bytes:
+    """Downscaled WebP preview; ``mtime`` is part of the cache key so regenerated frames refresh."""
+    with Image.open(path) as img:
+        img.thumbnail((max_side, max_side))
+        buf = BytesIO()
+        img.save(buf, format="WEBP", quality=80)
+    return buf.getvalue()
+
+
+def _preview_bytes(path: Optional[str], max_side: int = 384) -> Optional[bytes]:
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        return _thumbnail(path, os.path.getmtime(path), max_side)
+    except OSError:
+        return None
+
+
+@st.cache_resource
+def _video_executor() -> ThreadPoolExecutor:
+    """Process-wide worker so a video build keeps running across reruns."""
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="video_build")
+
+
+@st.cache_resource
+def _built_videos() -> dict[str, tuple[str, int]]:
+    """Process-wide map of video-build input key -> (final video path, mtime_ns when built)."""
+    return {}
+
+
+def _lookup_built_video(build_key: str) -> Optional[str]:
+    entry = _built_videos().get(build_key)
+    if entry is None:
+        return None
+    path, mtime_ns = entry
+    # final.mp4 is rewritten by later builds in the same run dir; only trust an untouched file.
+    if not os.path.exists(path) or os.stat(path).st_mtime_ns != mtime_ns:
+        return None
+    return path
+
+
+@st.cache_data(max_entries=256)
+def _file_digest(path: str, mtime_ns: int, size: int) -> bytes:
+    """sha256 of a frame image; keyed on mtime and size like io_utils.read_bytes_cached, so reruns skip the read."""
+    return hashlib.sha256(Path(path).read_bytes()).digest()
+
+
+def _video_build_key(frames: list[dict], frame_paths: dict[str, str], use_fake: bool) -> str:
+    """Fingerprint everything a video build depends on: frame images, motion notes, model and mode."""
+    cfg = get_default_config()
+    hasher = hashlib.sha256()
+    header = [cfg.video_model, cfg.aspect_ratio, cfg.segment_duration_seconds, use_fake]
+    hasher.update(json.dumps(header).encode("utf-8"))
+    for frame in frames:
+        fid = frame.get("id")
+        hasher.update(json.dumps([fid, frame.get("change_from_previous") or ""]).encode("utf-8"))
+        path = frame_paths.get(fid)
+        if path and os.path.exists(path):
+            stat = os.stat(path)
+            hasher.update(_file_digest(path, stat.st_mtime_ns, stat.st_size))
+    return hasher.hexdigest()
+
+
+def _cancel_video_build() -> None:
+    if state.video_cancel is not None:
+        state.video_cancel.set()
+    if state.video_future is not None:
+        state.video_future.cancel()
 
 
 def _reindex_frames():
     frames = state.frames
-    new_labels = list(string.ascii_uppercase[: len(frames)])
-    for frame, lbl in zip(frames, new_labels):
+    for frame, lbl in zip(frames, string.ascii_uppercase):
         frame["id"] = lbl
-    if state.frame_paths:
-        new_paths = {}
-        for frame in frames:
-            fid = frame["id"]
-            new_paths[fid] = state.frame_paths.get(fid, "")
-        state.frame_paths = new_paths
+    paths = state.frame_paths
+    if paths:
+        state.frame_paths = {frame["id"]: paths.get(frame["id"], "") for frame in frames}
+    # Per-frame widgets are keyed by label; drop their state so relabelled frames show their own text.
+    for key in [k for k in state.keys() if k.startswith(("prompt_", "change_", "nocache_"))]:
+        del state[key]
+
 
+def _delete_frame(idx: int) -> None:
+    # Runs as a button callback, i.e. before the rerun renders the frame list.
+    del state.frames[idx]
+    _reindex_frames()
 
+
+# Inputs live in forms so typing only reruns the script on submit, not per keystroke.
 col_add, col_ins = st.columns(2)
 with col_add:
-    new_prompt = st.text_input("末尾に追加するフレーム内容", key="add_prompt")
-    if st.button("末尾に追加"):
+    with st.form("add_frame_form", clear_on_submit=True):
+        new_prompt = st.text_input("末尾に追加するフレーム内容", key="add_prompt")
+        add_clicked = st.form_submit_button("末尾に追加")
+    if add_clicked:
         state.frames.append({"id": "Z", "prompt": new_prompt, "change_from_previous": ""})
         _reindex_frames()
 with col_ins:
     if state.frames:
-        positions = [f'{idx+1}: {frame["id"]}' for idx, frame in enumerate(state.frames)]
-        pos = st.selectbox("挿入位置を選択", positions, index=0)
-        insert_before = positions.index(pos)
-        ins_prompt = st.text_input("挿入するフレーム内容", key="insert_prompt")
-        if st.button("選択位置の前に挿入"):
+        with st.form("insert_frame_form", clear_on_submit=True):
+            positions = [f'{idx+1}: {frame["id"]}' for idx, frame in enumerate(state.frames)]
+            pos = st.selectbox("挿入位置を選択", positions, index=0)
+            ins_prompt = st.text_input("挿入するフレーム内容", key="insert_prompt")
+            insert_clicked = st.form_submit_button("選択位置の前に挿入")
+        if insert_clicked:
+            insert_before = positions.index(pos)
             state.frames.insert(
                 insert_before, {"id": "Z", "prompt": ins_prompt, "change_from_previous": ""}
             )
@@ -137,102 +262,139 @@ with col_ins:
 st.markdown("---")
 st.subheader("フレーム編集と逐次生成")
 
-if ref_file and state.ref_path is None:
-    state.ref_path = _save_uploaded_file(ref_file)
+_sync_ref_upload(ref_file)
 
 client = _select_client(state.use_fake_mode)
 if client is None:
     st.warning("APIモードが未設定です。REALかフェイクを選択してください。")
 
-for idx, frame in enumerate(state.frames):
+# Bind session-state lookups once per rerun; SessionStateProxy access is not free.
+frames = state.frames
+paths = state.frame_paths or {}
+for idx, frame in enumerate(frames):
+    frame_id = frame["id"]
     with st.container():
         header_col, _ = st.columns([1, 3])
         with header_col:
-            st.markdown(f"**Frame {frame['id']}**")
-
-        col_prompt, col_preview = st.columns([2, 1])
-        with col_prompt:
-            frame["prompt"] = st.text_area(
-                "フレーム説明",
-                value=frame.get("prompt", ""),
-                key=f"prompt_{frame['id']}",
-                height=120,
-            )
-            frame["change_from_previous"] = st.text_input(
-                "動き/変化のメモ（任意）",
-                value=frame.get("change_from_previous", ""),
-                key=f"change_{frame['id']}",
-            )
+            st.markdown(f"**Frame {frame_id}**")
+
+        with st.form(f"frame_form_{frame_id}"):
+            col_prompt, col_preview = st.columns([2, 1])
+            with col_prompt:
+                frame["prompt"] = st.text_area(
+                    "フレーム説明",
+                    value=frame.get("prompt", ""),
+                    key=f"prompt_{frame_id}",
+                    height=120,
+                )
+                frame["change_from_previous"] = st.text_input(
+                    "動き/変化のメモ（任意）",
+                    value=frame.get("change_from_previous", ""),
+                    key=f"change_{frame_id}",
+                )
 
-        with col_preview:
-            if state.frame_paths and frame["id"] in (state.frame_paths or {}):
-                st.image(
-                    state.frame_paths.get(frame["id"]),
-                    caption=f"Frame {frame['id']} プレビュー",
+            with col_preview:
+                preview = _preview_bytes(paths.get(frame_id))
+                if preview is not None:
+                    st.image(preview, caption=f"Frame {frame_id} プレビュー")
+
+            skip_cache = st.checkbox(
+                "キャッシュを使わずに再生成", value=False, key=f"nocache_{frame_id}"
+            )
+            col_save, col_submit = st.columns(2)
+            with col_save:
+                st.form_submit_button("説明を保存", key=f"save_{frame_id}")
+            with col_submit:
+                regen_clicked = st.form_submit_button(
+                    "このフレームを生成/再生成", key=f"regen_{frame_id}"
                 )
 
         st.markdown("---")
         col_regen, col_delete = st.columns(2)
         with col_regen:
-            if st.button("このフレームを生成/再生成", key=f"regen_{frame['id']}"):
+            if regen_clicked:
                 if client is None:
                     st.error("APIモードが未設定です。REALかフェイクを選択してください。")
                 else:
+                    # Imported on demand: pulls in google-genai types, which most reruns never need.
+                    from video_pipeline.images import regenerate_storyboard_images
+
                     _ensure_run_dir()
-                    prompts_data = {"frames": state.frames}
-                    frame_paths = state.frame_paths or {}
+                    prompts_data = {"frames": frames}
                     with st.spinner("生成中..."):
                         try:
                             updated_paths = regenerate_storyboard_images(
                                 prompts_data,
-                                frame_paths,
+                                paths,
                                 run_dir=state.run_dir,
-                                frame_ids=[frame["id"]],
+                                frame_ids=[frame_id],
                                 ref_image_path=state.ref_path,
                                 client=client,
+                                config=get_default_config(),
+                                cache_dir=None if skip_cache else _frame_cache_dir(),
                             )
                         except Exception as exc:  # noqa: BLE001
                             st.error(f"生成に失敗しました: {exc}")
                         else:
-                            state.frame_paths = updated_paths
+                            state.frame_paths = paths = updated_paths
                             state.prompts_data = prompts_data
-                            st.success(f"Frame {frame['id']} を生成しました。")
+                            st.success(f"Frame {frame_id} を生成しました。")
         with col_delete:
-            if len(state.frames) > 2 and st.button(
-                "このフレームを削除", key=f"delete_{frame['id']}"
-            ):
-                del state.frames[idx]
-                _reindex_frames()
-                st.experimental_rerun()
+            if len(frames) > 2:
+                st.button(
+                    "このフレームを削除",
+                    key=f"delete_{frame_id}",
+                    on_click=_delete_frame,
+                    args=(idx,),
+                )
 
 st.subheader("プレビュー一覧")
-if state.frame_paths:
-    for frame in state.frames:
+paths = state.frame_paths or {}
+if paths:
+    for frame in frames:
         frame_id = frame.get("id")
-        frame_path = state.frame_paths.get(frame_id) if frame_id else None
+        frame_path = paths.get(frame_id) if frame_id else None
         if not frame_path:
             continue
         with st.container():
             st.markdown(f"**Frame {frame_id}**\n\n{frame.get('prompt', '')}")
-            st.image(frame_path)
+            preview = _preview_bytes(frame_path, max_side=768)
+            if preview is not None:
+                st.image(preview)
 else:
     st.info("生成済みプレビューはまだありません。")
 
+bulk_skip_cache = st.checkbox("キャッシュを使わずに一括生成", value=False, key="nocache_bulk")
 if st.button("すべてのフレームを一括生成"):
     if client is None:
         st.error("APIモードが未設定です。REALかフェイクを選択してください。")
     else:
+        from video_pipeline.images import regenerate_storyboard_images
+
         _ensure_run_dir()
         prompts_data = {"frames": state.frames}
+        target_ids = [f["id"] for f in state.frames]
+        progress = st.progress(0.0, text="一括生成中...")
+        done_ids: list[str] = []
+
+        def _on_frame_done(frame_id: str, _path: str) -> None:
+            done_ids.append(frame_id)
+            progress.progress(
+                len(done_ids) / len(target_ids), text=f"Frame {frame_id} を生成しました"
+            )
+
         with st.spinner("一括生成中..."):
             try:
                 updated_paths = regenerate_storyboard_images(
                     prompts_data,
                     state.frame_paths or {},
                     run_dir=state.run_dir,
-                    frame_ids=[f["id"] for f in state.frames],
+                    frame_ids=target_ids,
                     ref_image_path=state.ref_path,
                     client=client,
+                    config=get_default_config(),
+                    on_frame_done=_on_frame_done,
+                    cache_dir=None if bulk_skip_cache else _frame_cache_dir(),
                 )
             except Exception as exc:  # noqa: BLE001
                 st.error(f"生成に失敗しました: {exc}")
@@ -242,33 +404,78 @@ if st.button("すべてのフレームを一括生成"):
                 st.success("全フレームを生成しました。")
 
 st.subheader("動画生成")
-if st.button("現在のフレームで動画を生成"):
+video_running = state.video_future is not None and not state.video_future.done()
+video_skip_cache = st.checkbox("キャッシュを使わずに動画を生成", value=False, key="nocache_video")
+if st.button("現在のフレームで動画を生成", disabled=video_running):
     if client is None:
         st.error("APIモードが未設定です。REALかフェイクを選択してください。")
     elif not state.frame_paths or len(state.frame_paths) < 2:
         st.error("少なくとも2フレームの画像を生成してください。")
     else:
-        _ensure_run_dir()
-        with st.spinner("動画を生成しています…"):
-            try:
-                final_path = build_video_from_frames(
-                    run_dir=state.run_dir,
-                    prompts_data={"frames": state.frames},
-                    frame_image_paths=state.frame_paths,
-                    client=client,
-                )
-            except Exception as exc:  # noqa: BLE001
-                st.error(f"動画の生成に失敗しました: {exc}")
-            else:
-                state.final_video_path = final_path
-                st.success("動画生成が完了しました。")
+        build_key = _video_build_key(state.frames, state.frame_paths, not real_enabled)
+        cached_path = None if video_skip_cache else _lookup_built_video(build_key)
+        if cached_path:
+            # Identical inputs were already rendered; skip the Veo calls entirely.
+            state.final_video_path = cached_path
+            st.success("同じ入力の動画を再利用しました。")
+        else:
+            from video_pipeline.run_pipeline import build_video_from_frames
+
+            _ensure_run_dir()
+            state.final_video_path = None
+            state.video_build_key = build_key
+            # The worker thread can't call st.*; it only updates this dict, which reruns poll.
+            progress = {"done": 0, "total": len(state.frames) - 1}
+            state.video_progress = progress
+            state.video_cancel = threading.Event()
+            # Snapshot inputs so edits made while the build runs don't leak into it.
+            state.video_future = _video_executor().submit(
+                build_video_from_frames,
+                run_dir=state.run_dir,
+                prompts_data={"frames": [dict(f) for f in state.frames]},
+                frame_image_paths=dict(state.frame_paths),
+                client=client,
+                config=get_default_config(),
+                on_segment_done=lambda done, total: progress.update(done=done, total=total),
+                cancel_event=state.video_cancel,
+                use_cache=not video_skip_cache,
+            )
+
+video_future = state.video_future
+if video_future is not None:
+    if video_future.done():
+        from video_pipeline.videos import GenerationCancelled
+
+        state.video_future = None
+        try:
+            state.final_video_path = video_future.result()
+        except (CancelledError, GenerationCancelled):
+            st.warning("動画の生成をキャンセルしました。")
+        except Exception as exc:  # noqa: BLE001
+            st.error(f"動画の生成に失敗しました: {exc}")
+        else:
+            if state.video_build_key:
+                final_path = str(state.final_video_path)
+                _built_videos()[state.video_build_key] = (final_path, os.stat(final_path).st_mtime_ns)
+            st.success("動画生成が完了しました。")
+    else:
+        progress = state.video_progress or {}
+        done, total = progress.get("done", 0), max(progress.get("total", 1), 1)
+        st.progress(done / total, text=f"動画を生成しています… セグメント {done}/{total}")
+        if state.video_cancel is not None and state.video_cancel.is_set():
+            st.info("キャンセル中です。現在のセグメントの完了を待っています…")
+        else:
+            st.button("生成をキャンセル", on_click=_cancel_video_build)
+        time.sleep(1)
+        st.rerun()
 
 if state.final_video_path:
     st.video(str(state.final_video_path))
-    with open(state.final_video_path, "rb") as f:
-        st.download_button(
-            "動画をダウンロード",
-            data=f,
-            file_name=Path(state.final_video_path).name,
-            mime="video/mp4",
-        )
+    video_path = Path(state.final_video_path)
+    # A callable defers the read until the user actually clicks, so reruns never touch the MP4.
+    st.download_button(
+        "動画をダウンロード",
+        data=video_path.read_bytes,
+        file_name=video_path.name,
+        mime="video/mp4",
+    )
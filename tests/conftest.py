@@ -3,9 +3,58 @@ from __future__ import annotations
 import sys
 from pathlib import Path
 
-# Ensure the repository root is on sys.path so absolute imports work when tests
-# are run from different working directories or virtual environments.
-ROOT = Path(__file__).resolve().parent.parent
-root_str = str(ROOT)
-if root_str not in sys.path:
-    sys.path.insert(0, root_str)
+import pytest
+
+
+def pytest_configure(config) -> None:
+    # Ensure the repository root is on sys.path so absolute imports work when tests
+    # are run from different working directories or virtual environments.
+    root = str(Path(__file__).resolve().parent.parent)
+    if root not in sys.path:
+        sys.path.insert(0, root)
+
+
+@pytest.fixture
+def frames_with_prompts(tmp_path):
+    """Three placeholder frame images (A, B, C) and the matching prompts_data."""
+    frames = {fid: tmp_path / f"{fid}.png" for fid in "ABC"}
+    for path in frames.values():
+        path.write_bytes(b"img")
+    prompts_data = {
+        "frames": [
+            {"id": "A", "prompt": "p0"},
+            {"id": "B", "prompt": "p1", "change_from_previous": "move1"},
+            {"id": "C", "prompt": "p2", "change_from_previous": "move2"},
+        ]
+    }
+    return frames, prompts_data
+
+
+@pytest.fixture
+def fake_segment_generator(monkeypatch):
+    """
+    Replace Veo segment generation and last-frame extraction in ``videos`` with file writers.
+
+    Returns the start image of every requested segment and every extracted last frame.
+    """
+    from video_pipeline import videos
+
+    calls: dict[str, list[Path]] = {"starts": [], "last_frames": []}
+
+    def fake_generate_segment_for_pair(frame1_path, frame2_path, motion_description, output_path, **kwargs):
+        calls["starts"].append(Path(frame1_path))
+        output = Path(output_path)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_bytes(b"video")
+        return str(output)
+
+    def fake_extract_last_frame(video_path, output_image_path):
+        out_path = Path(output_image_path)
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        out_path.write_bytes(b"last")
+        calls["last_frames"].append(out_path)
+        return out_path
+
+    monkeypatch.setattr(videos, "generate_segment_for_pair", fake_generate_segment_for_pair)
+    monkeypatch.setattr(videos, "extract_last_frame", fake_extract_last_frame)
+    return calls
@@ -2,7 +2,7 @@
 
 from __future__ import annotations
 
-import runpy
+import functools
 import sys
 import types
 from pathlib import Path
@@ -50,7 +50,16 @@ def _stub_streamlit_module() -> types.ModuleType:
     st.info = _noop
     st.error = _noop
     st.success = _noop
-    st.experimental_rerun = _noop
+    st.rerun = _noop
+
+    def _passthrough_cache(func=None, **kwargs):
+        # Support both ``@st.cache_resource`` and ``@st.cache_resource(ttl=...)``.
+        if func is None:
+            return lambda f: f
+        return func
+
+    st.cache_resource = _passthrough_cache
+    st.cache_data = _passthrough_cache
 
     def text_input(label, value: str = "", **kwargs):
         return value
@@ -71,6 +80,8 @@ def _stub_streamlit_module() -> types.ModuleType:
         return False
 
     st.button = button
+    st.form_submit_button = button
+    st.form = lambda *args, **kwargs: _DummyContainer()
 
     def file_uploader(*args, **kwargs):
         return None
@@ -84,21 +95,33 @@ def _stub_streamlit_module() -> types.ModuleType:
     st.columns = columns
     st.container = lambda **kwargs: _DummyContainer()
     st.spinner = lambda *args, **kwargs: _DummyContainer()
+    st.progress = lambda *args, **kwargs: types.SimpleNamespace(progress=_noop)
 
     return st
 
 
+# Built once per module; each test only swaps in a fresh session_state.
+_STUB = _stub_streamlit_module()
+
+
+@functools.lru_cache(maxsize=None)
+def _app_code():
+    """Compile app.py once; every test execs the same code object in fresh globals."""
+    app_path = ROOT / "app.py"
+    return compile(app_path.read_text(encoding="utf-8"), str(app_path), "exec")
+
+
 def test_app_boots_in_fake_mode(monkeypatch):
     """Ensure the Streamlit script runs against a stubbed API."""
     monkeypatch.setenv("USE_FAKE_GENAI", "1")
     monkeypatch.delenv("ENABLE_REAL_GENAI", raising=False)
 
     # Stub streamlit so the UI code can run without a real Streamlit runtime.
-    monkeypatch.setitem(sys.modules, "streamlit", _stub_streamlit_module())
+    _STUB.session_state = _DummySessionState()
+    monkeypatch.setitem(sys.modules, "streamlit", _STUB)
     sys.modules.pop("app", None)
 
-    app_path = ROOT / "app.py"
-    runpy.run_path(str(app_path), run_name="__main__")
+    exec(_app_code(), {"__name__": "__main__", "__file__": str(ROOT / "app.py")})
 
     st_stub = sys.modules["streamlit"]
     assert "frames" in st_stub.session_state
@@ -0,0 +1,21 @@
+import dataclasses
+
+import pytest
+
+from video_pipeline.config import PipelineConfig, get_default_config, image_cache_dir
+
+
+def test_default_config_is_shared_and_frozen():
+    cfg = get_default_config()
+
+    assert get_default_config() is cfg
+    assert cfg == PipelineConfig()
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        cfg.image_model = "other"  # type: ignore[misc]
+    assert {cfg: "usable as a cache key"}[PipelineConfig()] == "usable as a cache key"
+
+
+def test_image_cache_dir_lives_under_outputs_root(tmp_path):
+    cfg = PipelineConfig(outputs_root=tmp_path)
+
+    assert image_cache_dir(cfg) == tmp_path / ".cache" / "images"
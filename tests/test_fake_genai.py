@@ -1,8 +1,14 @@
 from __future__ import annotations
 
 import json
+import os
+import subprocess
+import sys
 from pathlib import Path
 
+import pytest
+
+import video_pipeline.fake_genai as fake_genai
 import video_pipeline.ffmpeg_utils as ffmpeg_utils
 from video_pipeline.config import PipelineConfig
 from video_pipeline.fake_genai import FakeGenaiClient
@@ -26,6 +32,44 @@ def test_fake_generate_content_image():
     assert img_bytes[:8] == b"\x89PNG\r\n\x1a\n"  # PNG signature
 
 
+def test_fake_client_leaves_env_untouched(monkeypatch):
+    monkeypatch.delenv("USE_FAKE_GENAI", raising=False)
+
+    client = FakeGenaiClient()
+
+    assert "USE_FAKE_GENAI" not in os.environ
+    assert fake_genai.is_fake_client(client)
+    assert not fake_genai.is_fake_client(object())
+
+
+def test_fake_image_prompt_parsing(monkeypatch):
+    seen = []
+    monkeypatch.setattr(fake_genai, "_make_png", lambda label, change: seen.append((label, change)) or b"png")
+    models = FakeGenaiClient().models
+
+    models.generate_content(model="gemini-2.5-flash-image", contents=["Frame c: hero\nVisible change: turns left\n"])
+    models.generate_content(model="gemini-2.5-flash-image", contents=["a quiet street"])
+    models.generate_content(model="gemini-2.5-flash-image", contents=["夜のネオン"])
+
+    assert seen == [("C", "turns left"), ("A", "delta"), ("?", "delta")]
+
+
+def test_fake_image_colors_are_stable_across_processes():
+    script = "from video_pipeline.fake_genai import _deterministic_color; print(_deterministic_color('Aseed'))"
+    outputs = {
+        subprocess.run(
+            [sys.executable, "-c", script],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).resolve().parents[1],
+            env={**os.environ, "PYTHONHASHSEED": seed},
+        ).stdout
+        for seed in ("1", "2")
+    }
+    assert outputs == {f"{fake_genai._deterministic_color('Aseed')}\n"}
+
+
 def test_fake_generate_videos_and_download(tmp_path):
     client = FakeGenaiClient()
     op = client.models.generate_videos(model="veo-3.1-generate-preview", prompt="demo", config={"duration_seconds": 2})
@@ -37,6 +81,22 @@ def test_fake_generate_videos_and_download(tmp_path):
     assert Path(video_path).exists()
 
 
+@pytest.mark.parametrize(("requested", "bundled"), [(1, 1), (2, 2), (3, 3), (8, 3)])
+def test_fake_generate_videos_uses_bundled_clip_of_requested_length(monkeypatch, tmp_path, requested, bundled):
+    monkeypatch.setattr(subprocess, "run", lambda *args, **kwargs: pytest.fail("ffmpeg spawned"))
+    client = FakeGenaiClient()
+
+    op = client.models.generate_videos(model="veo", prompt="a", config={"duration_seconds": requested})
+    video = op.response.generated_videos[0].video
+    destination = tmp_path / "segment.mp4"
+    client.files.download(file=video, destination=str(destination))
+
+    assert Path(video) == fake_genai._ASSETS_DIR / f"fake_segment_{bundled}s.mp4"
+    data = destination.read_bytes()
+    assert data == Path(video).read_bytes()
+    assert data[4:8] == b"ftyp"  # MP4 container signature
+
+
 def test_run_pipeline_with_fake_client(monkeypatch, tmp_path):
     monkeypatch.setenv("USE_FAKE_GENAI", "1")
     client = FakeGenaiClient()
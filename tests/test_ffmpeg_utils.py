@@ -1,13 +1,17 @@
+import shutil
+import subprocess
 from pathlib import Path
 
+import pytest
+
 from video_pipeline import ffmpeg_utils
 
 
 class _FakeCompletedProcess:
     def __init__(self, output_path: Path):
         self.returncode = 0
-        self.stdout = ""
-        self.stderr = ""
+        self.stdout = b""
+        self.stderr = b""
         output_path.write_bytes(b"fake video data")
 
 
@@ -17,7 +21,7 @@ def test_concat_clips_invokes_ffmpeg_and_writes_output(monkeypatch, tmp_path):
     clip1.write_bytes(b"clip1")
     clip2.write_bytes(b"clip2")
 
-    def fake_run(cmd, capture_output, text):
+    def fake_run(cmd, **kwargs):
         # The output path is the last argument in the command list.
         output = Path(cmd[-1])
         return _FakeCompletedProcess(output)
@@ -37,9 +41,9 @@ def test_concat_clips_escapes_single_quotes(monkeypatch, tmp_path):
 
     captured_list_content = {}
 
-    def fake_run(cmd, capture_output, text):
-        list_file = Path(cmd[7])
-        captured_list_content["lines"] = list_file.read_text().splitlines()
+    def fake_run(cmd, **kwargs):
+        assert cmd[cmd.index("-i") + 1] == "pipe:0"
+        captured_list_content["lines"] = kwargs["input"].decode("utf-8").splitlines()
         output = Path(cmd[-1])
         return _FakeCompletedProcess(output)
 
@@ -49,7 +53,7 @@ def test_concat_clips_escapes_single_quotes(monkeypatch, tmp_path):
     result = ffmpeg_utils.concat_clips([clip1], output_path)
 
     assert Path(result).exists()
-    assert captured_list_content["lines"] == ["file '" + clip1.as_posix().replace("'", "\\'") + "'"]
+    assert captured_list_content["lines"] == ["file 'file:" + clip1.as_posix().replace("'", "'\\''") + "'"]
 
 
 def test_extract_last_frame_invokes_ffmpeg(monkeypatch, tmp_path):
@@ -57,7 +61,7 @@ def test_extract_last_frame_invokes_ffmpeg(monkeypatch, tmp_path):
     image_path = tmp_path / "frames" / "last.png"
     video_path.write_bytes(b"video")
 
-    def fake_run(cmd, capture_output, text):
+    def fake_run(cmd, **kwargs):
         # Ensure ffmpeg writes to the requested path.
         Path(cmd[-1]).write_bytes(b"frame")
         return _FakeCompletedProcess(video_path)
@@ -71,46 +75,81 @@ def test_extract_last_frame_invokes_ffmpeg(monkeypatch, tmp_path):
     assert image_path.read_bytes() == b"frame"
 
 
-def test_concat_clips_writes_utf8_file_list(monkeypatch, tmp_path):
+def test_concat_clips_pipes_utf8_file_list(monkeypatch, tmp_path):
     """
-    Ensure concat_clips writes the concat list using UTF-8 so non-ASCII paths work on Windows.
+    Ensure concat_clips encodes the concat list as UTF-8 so non-ASCII paths work on Windows.
     """
     clip1 = tmp_path / "clip_あ.mp4"
     clip2 = tmp_path / "clip2.mp4"
     clip1.write_bytes(b"clip1")
     clip2.write_bytes(b"clip2")
 
-    list_file_path = tmp_path / "list.txt"
-
-    def fake_namedtempfile(*, mode, delete, suffix, encoding):
-        assert encoding == "utf-8"
+    def fake_run(cmd, **kwargs):
+        # Ensure the piped list contains the multibyte character for 'あ'.
+        assert b"\xe3\x81\x82" in kwargs["input"]  # 'あ' in UTF-8
+        assert cmd[cmd.index("-protocol_whitelist") + 1] == "file,pipe"
+        return _FakeCompletedProcess(Path(cmd[-1]))
 
-        class _Dummy:
-            name = str(list_file_path)
+    monkeypatch.setattr(ffmpeg_utils.subprocess, "run", fake_run)
 
-            def write(self, data: str):
-                # Write using the requested encoding to mimic tempfile's behavior.
-                with open(list_file_path, "a", encoding=encoding) as f:
-                    f.write(data)
+    output_path = tmp_path / "out.mp4"
+    result = ffmpeg_utils.concat_clips([clip1, clip2], output_path)
 
-            def __enter__(self):
-                return self
+    assert Path(result).exists()
 
-            def __exit__(self, exc_type, exc, tb):
-                pass
 
-        return _Dummy()
+def test_concat_clips_decodes_stderr_only_on_failure(monkeypatch, tmp_path):
+    clip = tmp_path / "clip.mp4"
+    clip.write_bytes(b"clip")
+    calls = []
 
-    def fake_run(cmd, capture_output, text):
-        # Ensure the list file contains the multibyte character for 'あ'.
-        data = list_file_path.read_bytes()
-        assert b"\xe3\x81\x82" in data  # 'あ' in UTF-8
-        return _FakeCompletedProcess(Path(cmd[-1]))
+    def fake_run(cmd, **kwargs):
+        calls.append((cmd, kwargs))
+        return type("Result", (), {"returncode": 1, "stderr": "壊れた入力".encode("utf-8")})()
 
-    monkeypatch.setattr(ffmpeg_utils.tempfile, "NamedTemporaryFile", fake_namedtempfile)
     monkeypatch.setattr(ffmpeg_utils.subprocess, "run", fake_run)
 
-    output_path = tmp_path / "out.mp4"
-    result = ffmpeg_utils.concat_clips([clip1, clip2], output_path)
-
-    assert Path(result).exists()
+    with pytest.raises(RuntimeError, match="壊れた入力"):
+        ffmpeg_utils.concat_clips([clip], tmp_path / "out.mp4")
+
+    assert len(calls) == 2  # stream copy, then the re-encode fallback
+    for cmd, kwargs in calls:
+        assert cmd[:6] == ffmpeg_utils.FFMPEG_BASE_ARGS
+        assert kwargs["stdout"] is subprocess.DEVNULL
+        assert kwargs["stderr"] is subprocess.PIPE
+        assert kwargs["input"] == f"file 'file:{clip.as_posix()}'\n".encode("utf-8")
+
+
+def test_concat_clips_reports_missing_clip(tmp_path):
+    with pytest.raises(FileNotFoundError, match="missing.mp4"):
+        ffmpeg_utils.concat_clips([tmp_path / "missing.mp4"], tmp_path / "out.mp4")
+
+
+def _make_test_clip(path: Path, color: str) -> None:
+    subprocess.run(
+        [
+            *ffmpeg_utils.FFMPEG_BASE_ARGS,
+            "-f",
+            "lavfi",
+            "-i",
+            f"color=c={color}:s=64x64:d=0.5",
+            "-c:v",
+            "mpeg4",
+            str(path),
+        ],
+        check=True,
+    )
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg is not installed")
+def test_concat_clips_joins_real_clips(tmp_path):
+    # A quote and non-ASCII characters exercise the concat list escaping end to end.
+    clip_dir = tmp_path / "q'x あ"
+    clip_dir.mkdir()
+    clips = [clip_dir / "a.mp4", clip_dir / "b.mp4"]
+    _make_test_clip(clips[0], "red")
+    _make_test_clip(clips[1], "blue")
+
+    output = Path(ffmpeg_utils.concat_clips(clips, tmp_path / "out.mp4", reencode_on_failure=False))
+
+    assert output.stat().st_size > 0
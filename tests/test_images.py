@@ -1,8 +1,11 @@
+import functools
 from pathlib import Path
+from types import SimpleNamespace
 
 import pytest
 
 from video_pipeline import images
+from video_pipeline.config import PipelineConfig
 from video_pipeline.fake_genai import FakeGenaiClient
 
 
@@ -53,6 +56,105 @@ def test_regenerate_storyboard_images_overwrites_selected(monkeypatch, tmp_path)
     assert Path(updated["C"]).read_bytes() == b"C0"  # untouched frame remains
 
 
+def test_regenerate_storyboard_images_reports_each_generated_frame(monkeypatch, tmp_path):
+    prompts_data = {
+        "frames": [
+            {"id": "A", "prompt": "alpha"},
+            {"id": "B", "prompt": "beta"},
+        ]
+    }
+
+    def fake_generate_image_bytes(prompt_text: str, ref_images: list[bytes], *, client, cfg):
+        return prompt_text.encode()
+
+    monkeypatch.setattr(images, "_generate_image_bytes", fake_generate_image_bytes)
+
+    reported: list[tuple[str, str]] = []
+    updated = images.regenerate_storyboard_images(
+        prompts_data,
+        {},
+        run_dir=tmp_path,
+        frame_ids=["A", "B"],
+        client=object(),
+        on_frame_done=lambda frame_id, path: reported.append((frame_id, path)),
+    )
+
+    assert reported == [("A", updated["A"]), ("B", updated["B"])]
+
+
+def test_regenerate_storyboard_images_serves_unchanged_frames_from_cache(monkeypatch, tmp_path):
+    prompts_data = {"frames": [{"id": "A", "prompt": "alpha"}, {"id": "B", "prompt": "beta"}]}
+    calls: list[str] = []
+
+    def fake_generate_image_bytes(prompt_text: str, ref_images: list[bytes], *, client, cfg):
+        calls.append(prompt_text)
+        return f"img-{prompt_text}-{len(calls)}".encode()
+
+    monkeypatch.setattr(images, "_generate_image_bytes", fake_generate_image_bytes)
+    cache_dir = tmp_path / ".cache"
+
+    first = images.regenerate_storyboard_images(
+        prompts_data, {}, run_dir=tmp_path, frame_ids=["A", "B"], client=object(), cache_dir=cache_dir
+    )
+    first_bytes = {fid: Path(path).read_bytes() for fid, path in first.items()}
+    images.regenerate_storyboard_images(
+        prompts_data, first, run_dir=tmp_path, frame_ids=["A", "B"], client=object(), cache_dir=cache_dir
+    )
+    assert calls == ["alpha", "beta"]
+    assert {fid: Path(path).read_bytes() for fid, path in first.items()} == first_bytes
+
+    # Changing frame A invalidates A and, through its reference bytes, frame B.
+    prompts_data["frames"][0]["prompt"] = "alpha2"
+    images.regenerate_storyboard_images(
+        prompts_data, first, run_dir=tmp_path, frame_ids=["A", "B"], client=object(), cache_dir=cache_dir
+    )
+    assert calls == ["alpha", "beta", "alpha2", "beta"]
+
+
+def test_generate_storyboard_images_shares_cache_with_regeneration(monkeypatch, tmp_path):
+    prompts_data = {"frames": [{"id": "A", "prompt": "alpha"}, {"id": "B", "prompt": "beta"}]}
+    calls: list[str] = []
+
+    def fake_generate_image_bytes(prompt_text: str, ref_images: list[bytes], *, client, cfg):
+        calls.append(prompt_text)
+        return prompt_text.encode()
+
+    monkeypatch.setattr(images, "_generate_image_bytes", fake_generate_image_bytes)
+    cache_dir = tmp_path / ".cache"
+
+    paths = images.generate_storyboard_images(prompts_data, tmp_path, client=object(), cache_dir=cache_dir)
+    images.regenerate_storyboard_images(
+        prompts_data, paths, run_dir=tmp_path, frame_ids=["A", "B"], client=object(), cache_dir=cache_dir
+    )
+
+    assert calls == ["alpha", "beta"]
+
+
+def test_regenerate_storyboard_images_treats_blank_paths_as_missing(monkeypatch, tmp_path):
+    frames_dir = tmp_path / "frames"
+    frames_dir.mkdir()
+    kept = frames_dir / "frame_A.png"
+    kept.write_bytes(b"A0")
+    prompts_data = {"frames": [{"id": "A", "prompt": "alpha"}, {"id": "B", "prompt": "beta"}]}
+
+    def fake_generate_image_bytes(prompt_text: str, ref_images: list[bytes], *, client, cfg):
+        assert ref_images == [b"A0"]
+        return b"B1"
+
+    monkeypatch.setattr(images, "_generate_image_bytes", fake_generate_image_bytes)
+
+    updated = images.regenerate_storyboard_images(
+        prompts_data,
+        {"A": str(kept), "B": ""},
+        run_dir=tmp_path,
+        frame_ids=[],
+        client=object(),
+    )
+
+    assert updated["B"] == str(frames_dir / "frame_B.png")
+    assert Path(updated["B"]).read_bytes() == b"B1"
+
+
 def test_generate_storyboard_images_accumulates_references(monkeypatch, tmp_path):
     prompts_data = {
         "frames": [
@@ -100,3 +202,108 @@ def test_fake_client_forces_fake_mode(monkeypatch, tmp_path):
     image_path = Path(paths["A"])
     assert image_path.exists()
 
+
+@pytest.mark.parametrize(
+    "response",
+    [
+        b"IMG",
+        {"inlineData": {"data": b"IMG"}},
+        {"candidates": [{"content": {"parts": [{"inline_data": {"data": b"IMG"}}]}}]},
+        {"generated_images": [{"data": b"IMG"}]},
+        SimpleNamespace(parts=None, candidates=[SimpleNamespace(content=SimpleNamespace(
+            parts=[SimpleNamespace(inline_data=SimpleNamespace(data=b"IMG"))]
+        ))]),
+    ],
+)
+def test_extract_image_bytes_handles_known_shapes(response):
+    expected = response if isinstance(response, bytes) else b"IMG"
+    assert images._extract_image_bytes(response) == expected
+
+
+def test_extract_image_bytes_reports_keys_on_failure():
+    with pytest.raises(ValueError, match="keys=\\['text'\\]"):
+        images._extract_image_bytes({"text": "no image"})
+
+
+class _FlakyModels:
+    def __init__(self, failures):
+        self.failures = list(failures)
+        self.calls = 0
+
+    def generate_content(self, **kwargs):
+        self.calls += 1
+        if self.failures:
+            raise self.failures.pop(0)
+        return {"inline_data": {"data": b"IMG"}}
+
+
+def _api_failure(kind: str) -> Exception:
+    import httpx
+    from google.genai import errors
+
+    return {
+        "server_error": lambda: errors.ServerError(503, {"error": {"message": "busy"}}),
+        "transport_error": lambda: httpx.ConnectError("connection reset"),
+        "bad_request": lambda: errors.ClientError(400, {"error": {"message": "bad request"}}),
+        "type_error": lambda: TypeError("bad argument"),
+    }[kind]()
+
+
+@pytest.mark.parametrize(
+    ("kind", "retried"),
+    [("server_error", True), ("transport_error", True), ("bad_request", False), ("type_error", False)],
+)
+def test_generate_image_bytes_retries_only_transient_errors(monkeypatch, kind, retried):
+    monkeypatch.delenv("USE_FAKE_GENAI", raising=False)
+    monkeypatch.setattr(images.time, "sleep", lambda seconds: None)
+    cfg = images.get_default_config()
+    failure = _api_failure(kind)
+    flaky = _FlakyModels([failure])
+    client = SimpleNamespace(models=flaky)
+
+    if retried:
+        assert images._generate_image_bytes("prompt", [], client=client, cfg=cfg) == b"IMG"
+    else:
+        with pytest.raises(type(failure)):
+            images._generate_image_bytes("prompt", [], client=client, cfg=cfg)
+    assert flaky.calls == (2 if retried else 1)
+
+
+def test_ref_parts_are_built_once_per_reference(monkeypatch):
+    built = []
+    monkeypatch.delenv("USE_FAKE_GENAI", raising=False)
+    monkeypatch.setattr(
+        images.types.resolve().Part, "from_bytes", staticmethod(lambda data, mime_type: built.append(data) or data)
+    )
+    # Fresh cache for this test, so the stubbed parts never leak into other tests.
+    monkeypatch.setattr(images, "_ref_part", functools.lru_cache(maxsize=32)(images._ref_part.__wrapped__))
+    client = SimpleNamespace(models=_FlakyModels([]))
+    cfg = images.get_default_config()
+    anchor = b"anchor-frame"
+
+    images._generate_image_bytes("one", [anchor], client=client, cfg=cfg)
+    images._generate_image_bytes("two", [anchor, b"second"], client=client, cfg=cfg)
+
+    assert built == [anchor, b"second"]
+
+
+def test_regenerate_storyboard_images_returns_only_current_frames(monkeypatch, tmp_path):
+    monkeypatch.setattr(images, "_generate_image_bytes", lambda prompt_text, ref_images, *, client, cfg: b"img")
+    prompts_data = {"frames": [{"id": "A", "prompt": "alpha"}]}
+
+    updated = images.regenerate_storyboard_images(
+        prompts_data,
+        {"Z": str(tmp_path / "stale.png")},
+        run_dir=tmp_path,
+        frame_ids=["A"],
+        client=object(),
+    )
+
+    assert list(updated) == ["A"]
+
+
+def test_image_cache_key_separates_fake_and_real_images():
+    cfg = PipelineConfig()
+    digests = [b"ref"]
+
+    assert images._image_cache_key("p", digests, cfg, True) != images._image_cache_key("p", digests, cfg, False)
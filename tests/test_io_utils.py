@@ -0,0 +1,94 @@
+import io
+import os
+from pathlib import Path
+
+import pytest
+
+from video_pipeline import io_utils
+
+
+class _Upload(io.BytesIO):
+    def __init__(self, data: bytes, name: str):
+        super().__init__(data)
+        self.name = name
+        self.size = len(data)
+
+
+def test_save_uploaded_file_streams_bytes_and_keeps_suffix(monkeypatch, tmp_path):
+    monkeypatch.setattr(io_utils, "COPY_CHUNK_SIZE", 4)
+    data = b"0123456789abcdef"
+
+    target = io_utils.save_uploaded_file(_Upload(data, "ref.JPG"), dest_dir=tmp_path)
+
+    assert target.suffix == ".JPG"
+    assert Path(target).read_bytes() == data
+
+
+def test_save_uploaded_file_defaults_to_png_suffix(tmp_path):
+    target = io_utils.save_uploaded_file(_Upload(b"img", "reference"), dest_dir=tmp_path)
+
+    assert target.suffix == ".png"
+
+
+def test_save_uploaded_file_reuses_identical_content(tmp_path):
+    first = io_utils.save_uploaded_file(_Upload(b"same", "a.png"), dest_dir=tmp_path)
+    second = io_utils.save_uploaded_file(_Upload(b"same", "b.png"), dest_dir=tmp_path)
+    other = io_utils.save_uploaded_file(_Upload(b"different", "a.png"), dest_dir=tmp_path)
+
+    assert first == second
+    assert other != first
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted({first.name, other.name})
+
+
+def test_save_uploaded_file_accepts_plain_file_objects(monkeypatch, tmp_path):
+    monkeypatch.setattr(io_utils, "COPY_CHUNK_SIZE", 3)
+    source = tmp_path / "src" / "upload.jpg"
+    source.parent.mkdir()
+    source.write_bytes(b"jpeg-bytes")
+
+    with source.open("rb") as upload:
+        target = io_utils.save_uploaded_file(upload, dest_dir=tmp_path / "out")
+
+    assert target.suffix == ".jpg"
+    assert target.read_bytes() == b"jpeg-bytes"
+
+
+def test_ensure_dir_creates_once(monkeypatch, tmp_path):
+    target = tmp_path / "a" / "b"
+    io_utils.ensure_dir(target)
+    assert target.is_dir()
+
+    calls = []
+    monkeypatch.setattr(io_utils.Path, "mkdir", lambda self, **kwargs: calls.append(self))
+    io_utils.ensure_dir(target)
+    assert calls == []
+
+
+def test_read_bytes_cached_picks_up_rewritten_files(tmp_path):
+    path = tmp_path / "frame.png"
+    path.write_bytes(b"old")
+    assert io_utils.read_bytes_cached(path) == b"old"
+
+    path.write_bytes(b"new")
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    assert io_utils.read_bytes_cached(path) == b"new"
+
+
+def test_atomic_write_leaves_no_partial_file_on_failure(tmp_path, monkeypatch):
+    target = tmp_path / "clip.mp4"
+    io_utils.atomic_write_bytes(target, b"first")
+    io_utils.atomic_copy(target, tmp_path / "copy.mp4")
+
+    def fail(src, dst):
+        Path(dst).write_bytes(b"trunc")
+        raise OSError("disk full")
+
+    monkeypatch.setattr(io_utils.shutil, "copyfile", fail)
+    with pytest.raises(OSError):
+        io_utils.atomic_copy(tmp_path / "copy.mp4", target)
+
+    assert target.read_bytes() == b"first"
+    assert (tmp_path / "copy.mp4").read_bytes() == b"first"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["clip.mp4", "copy.mp4"]
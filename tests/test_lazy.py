@@ -0,0 +1,21 @@
+import sys
+
+import pytest
+
+from video_pipeline._lazy import LazyModule
+
+
+def test_lazy_module_imports_on_first_attribute_access(monkeypatch):
+    monkeypatch.delitem(sys.modules, "colorsys", raising=False)
+    lazy = LazyModule("colorsys")
+
+    assert "colorsys" not in sys.modules
+    assert lazy.rgb_to_hsv(0, 0, 0) == (0, 0, 0)
+    assert "colorsys" in sys.modules
+
+
+def test_lazy_module_raises_import_error_only_when_used():
+    lazy = LazyModule("video_pipeline_missing_module")
+
+    with pytest.raises(ImportError):
+        lazy.resolve()
@@ -1,4 +1,6 @@
+import threading
 from pathlib import Path
+from types import SimpleNamespace
 
 import pytest
 
@@ -6,49 +8,39 @@ from video_pipeline.fake_genai import FakeGenaiClient
 from video_pipeline import videos
 
 
-def test_generate_all_segments_reuses_last_frame(monkeypatch, tmp_path):
-    frames = {
-        "A": tmp_path / "A.png",
-        "B": tmp_path / "B.png",
-        "C": tmp_path / "C.png",
-    }
-    for path in frames.values():
-        path.write_bytes(b"img")
-
-    prompts_data = {
-        "frames": [
-            {"id": "A", "prompt": "p0"},
-            {"id": "B", "prompt": "p1", "change_from_previous": "move1"},
-            {"id": "C", "prompt": "p2", "change_from_previous": "move2"},
-        ]
-    }
+def test_generate_all_segments_reuses_last_frame(frames_with_prompts, fake_segment_generator, tmp_path):
+    frames, prompts_data = frames_with_prompts
 
-    start_images = []
+    results = videos.generate_all_segments(frames, prompts_data, tmp_path, client=FakeGenaiClient())
 
-    def fake_generate_segment_for_pair(frame1_path, frame2_path, motion_description, output_path, **kwargs):
-        start_images.append(Path(frame1_path))
-        output = Path(output_path)
-        output.parent.mkdir(parents=True, exist_ok=True)
-        output.write_bytes(b"video")
-        return str(output)
+    assert len(results) == 2
+    assert fake_segment_generator["starts"][0] == frames["A"].resolve()
+    assert fake_segment_generator["starts"][1] == fake_segment_generator["last_frames"][0].resolve()
 
-    last_frame_files = []
 
-    def fake_extract_last_frame(video_path, output_image_path):
-        out_path = Path(output_image_path)
-        out_path.parent.mkdir(parents=True, exist_ok=True)
-        out_path.write_bytes(b"last")
-        last_frame_files.append(out_path)
-        return out_path
+def test_generate_all_segments_reports_progress_and_honours_cancel(
+    frames_with_prompts, fake_segment_generator, tmp_path
+):
+    frames, prompts_data = frames_with_prompts
+    cancel = threading.Event()
+    progress: list[tuple[int, int]] = []
 
-    monkeypatch.setattr(videos, "generate_segment_for_pair", fake_generate_segment_for_pair)
-    monkeypatch.setattr(videos, "extract_last_frame", fake_extract_last_frame)
+    def on_segment_done(done: int, total: int) -> None:
+        progress.append((done, total))
+        cancel.set()
 
-    results = videos.generate_all_segments(frames, prompts_data, tmp_path, client=FakeGenaiClient())
+    with pytest.raises(videos.GenerationCancelled):
+        videos.generate_all_segments(
+            frames,
+            prompts_data,
+            tmp_path,
+            client=FakeGenaiClient(),
+            on_segment_done=on_segment_done,
+            cancel_event=cancel,
+        )
 
-    assert len(results) == 2
-    assert start_images[0] == frames["A"].resolve()
-    assert start_images[1] == last_frame_files[0].resolve()
+    assert progress == [(1, 2)]
+    assert len(fake_segment_generator["starts"]) == 1
 
 
 def test_generate_all_segments_requires_two_frames(tmp_path):
@@ -91,3 +83,128 @@ def test_fake_client_ignores_env_setting(monkeypatch, tmp_path):
 
     assert Path(result).exists()
 
+
+def test_poll_delays_back_off_to_the_cap():
+    cfg = videos.PipelineConfig(poll_initial_seconds=1.0, poll_max_seconds=4.0)
+    delays = videos._poll_delays(cfg)
+
+    first = [next(delays) for _ in range(8)]
+
+    assert first[0] == 1.0
+    assert 1.5 <= first[1] <= 1.75
+    assert all(d <= 4.0 for d in first)
+    assert first[5:] == [4.0, 4.0, 4.0]
+
+
+def test_download_video_streams_to_destination_or_falls_back(tmp_path):
+    streamed = tmp_path / "streamed.mp4"
+    destinations = []
+
+    def download_to_destination(*, file, destination=None):
+        destinations.append(destination)
+        Path(destination).write_bytes(b"clip")
+
+    videos._download_video(SimpleNamespace(files=SimpleNamespace(download=download_to_destination)), "v", streamed)
+    assert destinations == [str(streamed) + ".part"]
+    assert streamed.read_bytes() == b"clip"
+
+    legacy = tmp_path / "legacy.mp4"
+    videos._download_video(SimpleNamespace(files=SimpleNamespace(download=lambda *, file: b"old-sdk")), "v", legacy)
+    assert legacy.read_bytes() == b"old-sdk"
+
+    def failing(*, file, destination=None):
+        calls.append(destination)
+        raise TypeError("bad response")
+
+    calls = []
+    with pytest.raises(TypeError, match="bad response"):
+        videos._download_video(SimpleNamespace(files=SimpleNamespace(download=failing)), "v", tmp_path / "typed.mp4")
+    assert calls == [str(tmp_path / "typed.mp4.part")]
+
+    def interrupted(*, file, destination=None):
+        Path(destination).write_bytes(b"cl")
+        raise ConnectionError("reset")
+
+    broken = tmp_path / "broken.mp4"
+    with pytest.raises(ConnectionError):
+        videos._download_video(SimpleNamespace(files=SimpleNamespace(download=interrupted)), "v", broken)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["legacy.mp4", "streamed.mp4"]
+
+
+def test_generate_all_segments_reuses_cached_segments(frames_with_prompts, fake_segment_generator, tmp_path):
+    frames, prompts_data = frames_with_prompts
+
+    videos.generate_all_segments(frames, prompts_data, tmp_path, client=FakeGenaiClient())
+    assert len(fake_segment_generator["starts"]) == 2
+
+    # Same inputs: both segments and their last frames are served from the cache.
+    videos.generate_all_segments(frames, prompts_data, tmp_path, client=FakeGenaiClient())
+    assert len(fake_segment_generator["starts"]) == 2
+    assert len(fake_segment_generator["last_frames"]) == 2
+
+    # Only the last motion changed: the first segment is still reused.
+    prompts_data["frames"][2]["change_from_previous"] = "move3"
+    clips = videos.generate_all_segments(frames, prompts_data, tmp_path, client=FakeGenaiClient())
+    assert len(fake_segment_generator["starts"]) == 3
+    assert all(Path(clip).read_bytes() == b"video" for clip in clips)
+
+    # use_cache=False asks for fresh clips even though every segment is cached.
+    videos.generate_all_segments(frames, prompts_data, tmp_path, client=FakeGenaiClient(), use_cache=False)
+    assert len(fake_segment_generator["starts"]) == 5
+
+
+def test_response_fields_lists_instance_fields_only():
+    class Response:
+        __slots__ = ()
+
+    response = SimpleNamespace(videos_pending=True, _private=1)
+
+    assert videos._response_fields(response) == ["videos_pending"]
+    assert videos._response_fields(Response()) == ["Response"]
+    assert videos._response_fields({"error": None}) == ["error"]
+    assert videos._response_fields(None) == []
+
+
+def test_generate_segment_keeps_polling_through_transient_errors(monkeypatch, tmp_path):
+    from google.genai import errors
+
+    monkeypatch.delenv("USE_FAKE_GENAI", raising=False)
+    monkeypatch.setattr(videos.time, "sleep", lambda seconds: None)
+    frame = tmp_path / "frame.png"
+    frame.write_bytes(b"png")
+    done = SimpleNamespace(done=True, error=None, response=SimpleNamespace(generated_videos=[SimpleNamespace(video="v")]))
+    polls = [errors.ServerError(503, {"error": {"message": "busy"}}), done]
+
+    def get(operation):
+        result = polls.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def download(*, file, destination):
+        Path(destination).write_bytes(b"clip")
+
+    client = SimpleNamespace(
+        models=SimpleNamespace(generate_videos=lambda **kwargs: SimpleNamespace(done=False)),
+        operations=SimpleNamespace(get=get),
+        files=SimpleNamespace(download=download),
+    )
+
+    output = tmp_path / "segment.mp4"
+    videos.generate_segment_for_pair(frame, frame, "pan", output, client=client)
+
+    assert polls == []
+    assert output.read_bytes() == b"clip"
+
+
+def test_generate_all_segments_checks_every_frame_before_generating(
+    frames_with_prompts, fake_segment_generator, tmp_path
+):
+    frames, prompts_data = frames_with_prompts
+    last_id = prompts_data["frames"][-1]["id"]
+    frames = {frame_id: path for frame_id, path in frames.items() if frame_id != last_id}
+
+    with pytest.raises(KeyError, match=f"id={last_id}"):
+        videos.generate_all_segments(frames, prompts_data, tmp_path, client=FakeGenaiClient())
+
+    assert fake_segment_generator["starts"] == []
@@ -0,0 +1,52 @@
+"""Helpers shared by the image and video generation modules."""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+from ._lazy import LazyModule
+from .config import use_fake_genai
+from .fake_genai import is_fake_client
+
+# Resolved on first use so fake/offline runs never import google-genai.
+types = LazyModule("google.genai.types")
+# Only consulted once a real API call has failed.
+errors = LazyModule("google.genai.errors")
+httpx = LazyModule("httpx")
+
+
+_MIME_BY_SUFFIX = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png"}
+
+
+def guess_mime_type(path: Path) -> str:
+    return _MIME_BY_SUFFIX.get(path.suffix.lower(), "image/png")
+
+
+def is_fake_mode(client) -> bool:
+    return is_fake_client(client) or use_fake_genai()
+
+
+def require_types(fake_mode: bool, *, purpose: str) -> None:
+    """Make sure google-genai is importable before building typed requests for ``purpose``."""
+    if fake_mode:
+        return
+    try:
+        types.resolve()
+    except ImportError as exc:
+        raise ImportError(
+            f"google-genai is required for {purpose}. Install dependencies from requirements.txt."
+        ) from exc
+
+
+def is_transient_api_error(exc: BaseException) -> bool:
+    """
+    Dropped connections, timeouts, server-side failures and rate limits (HTTP 429) are worth
+    retrying; other client errors are not.
+    """
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    if isinstance(exc, (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError)):
+        return True
+    if isinstance(exc, errors.ServerError):
+        return True
+    return isinstance(exc, errors.ClientError) and getattr(exc, "code", None) == 429
@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+import importlib
+from types import ModuleType
+from typing import Any, Optional
+
+
+class LazyModule:
+    """
+    Stand-in for a module that is imported on first attribute access.
+
+    Used for ``google.genai.types`` so fake/offline runs never pay the google-genai import cost.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module: Optional[ModuleType] = None
+
+    def resolve(self) -> ModuleType:
+        """Import (once) and return the real module; raises ImportError if it is not installed."""
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self.resolve(), attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<LazyModule {self._name!r} ({state})>"
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import functools
 import os
 from dataclasses import dataclass
 from datetime import datetime
@@ -10,9 +11,14 @@ from dotenv import load_dotenv
 
 from .fake_genai import FakeGenaiClient
 
-load_dotenv()
 
-@dataclass
+@functools.cache
+def _ensure_env_loaded() -> None:
+    """Read .env on first use instead of at import time; later calls are a cache hit."""
+    load_dotenv()
+
+
+@dataclass(frozen=True, slots=True)
 class PipelineConfig:
     text_model: str = "gemini-2.5-flash"
     image_model: str = "gemini-2.5-flash-image"
@@ -20,18 +26,25 @@ class PipelineConfig:
     aspect_ratio: str = "16:9"
     # Veo interpolation (first + last frame) requires 8-second segments.
     segment_duration_seconds: int = 8
+    # Veo operation polling: start short, back off to the cap (plus a little jitter).
+    poll_initial_seconds: float = 0.5
+    poll_max_seconds: float = 10.0
     outputs_root: Path = Path("outputs")
 
 
+@functools.cache
 def get_default_config() -> PipelineConfig:
+    # Frozen, so a single shared instance is safe to hand out (and to use as a cache key).
     return PipelineConfig()
 
 
 def is_real_api_enabled() -> bool:
+    _ensure_env_loaded()
     return os.getenv("ENABLE_REAL_GENAI") == "1"
 
 
 def use_fake_genai() -> bool:
+    _ensure_env_loaded()
     return os.getenv("USE_FAKE_GENAI") == "1"
 
 
@@ -66,6 +79,12 @@ def get_genai_client():
     )
 
 
+def image_cache_dir(config: Optional[PipelineConfig] = None) -> Path:
+    """Content-addressed storyboard image cache shared by every run under ``outputs_root``."""
+    cfg = config or get_default_config()
+    return cfg.outputs_root / ".cache" / "images"
+
+
 def make_run_directory(config: Optional[PipelineConfig] = None, run_name: Optional[str] = None) -> Path:
     cfg = config or get_default_config()
     timestamp = datetime.now().strftime("%Y%m%dT%H%M%S")
@@ -3,7 +3,7 @@ Offline/demo fake client that mimics the subset of google-genai APIs used in thi
 
 It provides:
 - models.generate_content for text and image (returns inline PNG bytes for image).
-- models.generate_videos for Veo-like calls (creates a tiny MP4 via ffmpeg).
+- models.generate_videos for Veo-like calls (returns a bundled tiny MP4 of the requested length, up to 3s).
 - operations.get returning the same completed operation.
 - files.download returning file bytes for a given path.
 
@@ -13,51 +13,70 @@ or real API keys. Outputs are clearly synthetic but structurally compatible with
 
 from __future__ import annotations
 
+import functools
+import hashlib
+import io
 import json
-import os
-import subprocess
-import tempfile
+import re
+import shutil
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Any, List, Optional
 
 from PIL import Image, ImageDraw, ImageFont
 
+
 # ---------------------------------------------------------------------------
 # Helper data structures to mirror google-genai response shapes (loosely).
 
 
-@dataclass
+@dataclass(slots=True)
 class _InlineData:
     data: bytes
 
 
-@dataclass
+@dataclass(slots=True)
 class _Part:
     inline_data: _InlineData
 
 
+@dataclass(slots=True)
+class _Content:
+    parts: List[_Part]
+
+
+@dataclass(slots=True)
+class _Candidate:
+    content: _Content
+
+
 class _ContentResponse:
+    __slots__ = ("text", "parts", "candidates")
+
     def __init__(self, *, text: str | None = None, parts: Optional[List[_Part]] = None):
         self.text = text
         self.parts = parts or []
-        self.candidates = []
+        self.candidates: List[_Candidate] = []
         if not text and parts:
             # Some callers might look at candidates[0].content.parts; keep minimal shape.
-            self.candidates = [type("Cand", (), {"content": type("Content", (), {"parts": parts})()})()]
+            self.candidates = [_Candidate(_Content(parts))]
 
 
+@dataclass(slots=True)
 class _GeneratedVideo:
-    def __init__(self, video_path: str):
-        self.video = video_path
+    video: str
 
 
 class _VideoResponse:
+    __slots__ = ("generated_videos",)
+
     def __init__(self, video_path: str):
         self.generated_videos = [_GeneratedVideo(video_path)]
 
 
 class _Operation:
+    __slots__ = ("done", "response", "error")
+
     def __init__(self, video_path: str):
         self.done = True
         self.response = _VideoResponse(video_path)
@@ -66,16 +85,24 @@ class _Operation:
 
 class _Files:
     @staticmethod
-    def download(file: str, config: Any | None = None, download_path: str | None = None):
+    def download(
+        *,
+        file: str,
+        destination: str | None = None,
+        config: Any | None = None,
+        download_path: str | None = None,
+    ):
         """
-        Match the real client signature: download(file, config=None) -> bytes.
+        Match the real client's keyword-only signature: download(*, file, destination=None, config=None).
+        Returns the bytes, or None after copying to ``destination``.
         download_path is accepted for backward compatibility; config is ignored.
         """
-        path = Path(file)
-        data = path.read_bytes()
+        if destination:
+            shutil.copyfile(file, destination)
+            return None
         if download_path:
-            Path(download_path).write_bytes(data)
-        return data
+            shutil.copyfile(file, download_path)
+        return Path(file).read_bytes()
 
 
 class _Operations:
@@ -89,60 +116,57 @@ class _Operations:
 
 
 def _deterministic_color(seed: str) -> tuple[int, int, int]:
-    # Simple hash to RGB
-    h = abs(hash(seed))
-    return (50 + h % 205, 50 + (h // 10) % 205, 50 + (h // 100) % 205)
+    # Stable across processes (unlike the salted built-in hash()), so fake frames are reproducible.
+    r, g, b = hashlib.blake2b(seed.encode("utf-8"), digest_size=3).digest()
+    return (50 + r % 205, 50 + g % 205, 50 + b % 205)
 
 
+@functools.lru_cache(maxsize=1)
+def _load_fonts() -> tuple[Any, Any]:
+    """Open the label fonts once; falls back to Pillow's built-in font when Arial is missing."""
+    try:
+        return ImageFont.truetype("arial.ttf", 64), ImageFont.truetype("arial.ttf", 32)
+    except Exception:
+        default = ImageFont.load_default()
+        return default, default
+
+
+@functools.lru_cache(maxsize=128)
 def _make_png(frame_label: str, subtitle: str) -> bytes:
     width, height = 1280, 720
     image = Image.new("RGB", (width, height), _deterministic_color(frame_label + subtitle))
     draw = ImageDraw.Draw(image)
-    try:
-        font = ImageFont.truetype("arial.ttf", 64)
-        small_font = ImageFont.truetype("arial.ttf", 32)
-    except Exception:
-        font = ImageFont.load_default()
-        small_font = ImageFont.load_default()
+    font, small_font = _load_fonts()
     draw.text((40, 40), f"Frame {frame_label}", fill="white", font=font)
     draw.text((40, 140), subtitle[:80], fill="white", font=small_font)
-    buf = tempfile.NamedTemporaryFile(delete=False, suffix=".png")
-    try:
-        image.save(buf.name, format="PNG")
-        buf.close()
-        data = Path(buf.name).read_bytes()
-    finally:
-        Path(buf.name).unlink(missing_ok=True)
-    return data
-
-
-def _make_fake_video(video_path: Path, duration: int = 2):
-    video_path.parent.mkdir(parents=True, exist_ok=True)
-    color = "gray"
-    cmd = [
-        "ffmpeg",
-        "-y",
-        "-f",
-        "lavfi",
-        "-i",
-        f"color=c={color}:s=1280x720:d={duration}",
-        "-pix_fmt",
-        "yuv420p",
-        str(video_path),
-    ]
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        if result.returncode != 0:
-            raise RuntimeError(result.stderr)
-    except Exception:
-        # Fallback: write dummy bytes; downstream concat may fail, but keeps tests from crashing hard.
-        video_path.write_bytes(b"FAKE_VIDEO")
-    return video_path
+    # Encode in memory; a low zlib level is plenty for flat placeholder frames.
+    buf = io.BytesIO()
+    image.save(buf, format="PNG", compress_level=1)
+    return buf.getvalue()
+
+
+# Plain gray 1280x720 H.264 clips (3-6 KB each), one per supported fake clip length, rendered once with
+# ffmpeg -f lavfi -i color=c=gray:s=1280x720:d=<n>:r=24 -c:v libx264 -tune stillimage -pix_fmt yuv420p
+_ASSETS_DIR = Path(__file__).with_name("assets")
+# Fake clips are capped at 3s to keep offline runs and tests fast.
+_FAKE_VIDEO_MAX_SECONDS = 3
+
+
+def _fake_video_for(duration: int) -> Path:
+    """Bundled clip matching ``duration`` (clamped to 1-3s); no ffmpeg process and no temp files."""
+    seconds = max(1, min(int(duration), _FAKE_VIDEO_MAX_SECONDS))
+    return _ASSETS_DIR / f"fake_segment_{seconds}s.mp4"
 
 
 # ---------------------------------------------------------------------------
 # Fake models implementation
 
+# "Frame X" wins; otherwise fall back to the first standalone A-F token in the prompt.
+_LABEL_RE = re.compile(r"Frame\s*:*([^\s:])")
+_BARE_LABEL_RE = re.compile(r"(?<!\S)([A-Fa-f])(?!\S)")
+_CHANGE_RE = re.compile(r"Visible change:([^\n]*)")
+_FRAMES_RE = re.compile(r"Frames to produce:([^\r\n]*)")
+
 
 class _Models:
     def __init__(self, parent: "FakeGenaiClient"):
@@ -166,18 +190,12 @@ class _Models:
             change = "delta"
             if prompt_text:
                 # Crude parse to extract "Frame X" and "Visible change: ..."
-                for token in prompt_text.split():
-                    if token.upper() in {"A", "B", "C", "D", "E", "F"}:
-                        label = token.upper()
-                        break
-                if "Frame" in prompt_text:
-                    parts = prompt_text.split("Frame")
-                    if len(parts) > 1:
-                        maybe = parts[1].strip().split()[0].strip(":")
-                        if maybe:
-                            label = maybe[0].upper()
-                if "Visible change:" in prompt_text:
-                    change = prompt_text.split("Visible change:")[1].split("\n")[0].strip()
+                match = _LABEL_RE.search(prompt_text) or _BARE_LABEL_RE.search(prompt_text)
+                if match:
+                    label = match.group(1).upper()
+                match = _CHANGE_RE.search(prompt_text)
+                if match:
+                    change = match.group(1).strip()
             data = _make_png(label, change)
             return _ContentResponse(parts=[_Part(_InlineData(data))])
 
@@ -187,12 +205,9 @@ class _Models:
             if isinstance(item, str):
                 prompt_text = item
         frame_labels = ["A", "B", "C"]
-        if "Frames to produce:" in prompt_text:
-            try:
-                segment = prompt_text.split("Frames to produce:")[1].splitlines()[0]
-                frame_labels = [f.strip() for f in segment.split(",") if f.strip()]
-            except Exception:
-                frame_labels = ["A", "B", "C"]
+        match = _FRAMES_RE.search(prompt_text)
+        if match:
+            frame_labels = [f.strip() for f in match.group(1).split(",") if f.strip()]
         frames = []
         for idx, lbl in enumerate(frame_labels):
             if idx == 0:
@@ -217,12 +232,9 @@ class _Models:
         else:
             duration = getattr(config, "duration_seconds", duration) or duration
             aspect_ratio = getattr(config, "aspect_ratio", aspect_ratio) or aspect_ratio
-        # Ensure consistent output path
-        tmp_dir = Path(tempfile.mkdtemp(prefix="fake_video_"))
-        file_path = tmp_dir / "segment.mp4"
-        # Keep duration small to speed up tests
-        _make_fake_video(file_path, duration=min(duration, 3))
-        return _Operation(str(file_path))
+        # The bundled clips are never modified, so the operation can point at one directly;
+        # files.download copies it to wherever the caller wants it.
+        return _Operation(str(_fake_video_for(duration)))
 
 
 # ---------------------------------------------------------------------------
@@ -235,8 +247,8 @@ class FakeGenaiClient:
     """
 
     def __init__(self):
-        # Ensure config.use_fake_genai() sees fake mode even if the caller forgets to set the env var.
-        os.environ["USE_FAKE_GENAI"] = "1"
+        # Pipeline code recognises fake clients via is_fake_client(); constructing one no longer
+        # flips the process-wide USE_FAKE_GENAI flag.
         self.is_fake_genai = True
         self.models = _Models(self)
         self.operations = _Operations()
@@ -244,4 +256,4 @@ class FakeGenaiClient:
 
 
 def is_fake_client(obj: Any) -> bool:
-    return getattr(obj, "is_fake_genai", False)
+    return isinstance(obj, FakeGenaiClient)
@@ -1,17 +1,40 @@
 from __future__ import annotations
 
+import os
 import subprocess
-import tempfile
 from pathlib import Path
 from typing import Iterable, Union
 
 from PIL import Image
 
+from .io_utils import ensure_dir
+
 
 class FFmpegError(RuntimeError):
     """Raised when an ffmpeg command fails."""
 
 
+# Quiet, non-interactive invocation: only errors reach stderr, so success paths have nothing to drain.
+FFMPEG_BASE_ARGS = ["ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error", "-y"]
+
+
+def _run_ffmpeg(cmd: list[str], input: bytes | None = None) -> subprocess.CompletedProcess:
+    kwargs = {"stdout": subprocess.DEVNULL, "stderr": subprocess.PIPE}
+    if input is not None:
+        kwargs["input"] = input
+    return subprocess.run(cmd, **kwargs)
+
+
+def _stderr_text(result: subprocess.CompletedProcess) -> str:
+    """Decode stderr lazily; only called on failure paths."""
+    return (result.stderr or b"").decode("utf-8", errors="replace")
+
+
+def _fast_abs(path: Path) -> Path:
+    """Absolute form of ``path``; skips the symlink-resolving ``resolve()`` when already absolute."""
+    return path if path.is_absolute() else path.resolve()
+
+
 def extract_last_frame(video_path: Union[str, Path], output_image_path: Union[str, Path]) -> Path:
     """
     Extract (approximately) the last frame of a video to an image file.
@@ -20,13 +43,12 @@ def extract_last_frame(video_path: Union[str, Path], output_image_path: Union[st
     Parents of ``output_image_path`` are created automatically.
     """
 
-    video_path = Path(video_path).resolve()
-    output_image = Path(output_image_path).resolve()
-    output_image.parent.mkdir(parents=True, exist_ok=True)
+    video_path = _fast_abs(Path(video_path))
+    output_image = _fast_abs(Path(output_image_path))
+    ensure_dir(output_image.parent)
 
     cmd = [
-        "ffmpeg",
-        "-y",
+        *FFMPEG_BASE_ARGS,
         "-sseof",
         "-1",
         "-i",
@@ -37,12 +59,12 @@ def extract_last_frame(video_path: Union[str, Path], output_image_path: Union[st
     ]
 
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = _run_ffmpeg(cmd)
         if result.returncode != 0:
             raise FFmpegError(
                 "ffmpeg failed to extract last frame:\n"
                 f"Command: {' '.join(cmd)}\n"
-                f"stderr: {result.stderr}"
+                f"stderr: {_stderr_text(result)}"
             )
     except FileNotFoundError:
         # Offline/test environments may not have ffmpeg; write a tiny placeholder image instead.
@@ -53,73 +75,67 @@ def extract_last_frame(video_path: Union[str, Path], output_image_path: Union[st
 
 
 def _format_concat_line(path: Path) -> str:
-    """Format a concat list line, escaping single quotes in paths."""
+    """
+    Format a concat list line for an absolute ``path``.
 
-    escaped = path.as_posix().replace("'", r"\'")
-    return f"file '{escaped}'\n"
+    The ``file:`` prefix is required because the list is read from ``pipe:0``; bare paths would
+    be resolved relative to the pipe URL. Inside single quotes the concat parser treats nothing
+    as an escape, so a quote is written as ``'\\''`` (close, escaped quote, reopen).
+    """
+
+    escaped = path.as_posix().replace("'", "'\\''")
+    return f"file 'file:{escaped}'\n"
 
 
 def concat_clips(clip_paths: Iterable[Union[str, Path]], output_path: Path, *, reencode_on_failure: bool = True) -> str:
     """
     Concatenate MP4 clips using ffmpeg concat demuxer.
+
+    Clips are stream-copied; with ``reencode_on_failure`` (the default) a failed copy is retried
+    as an H.264/AAC re-encode for inputs whose codecs do not match.
     """
     # Normalize to absolute paths so Streamlit / temp working directories don't break concat.
-    clip_list = [Path(p).resolve() for p in clip_paths]
+    clip_list = [_fast_abs(Path(p)) for p in clip_paths]
     if not clip_list:
         raise ValueError("No clip paths provided for concatenation")
     for clip in clip_list:
-        if not clip.exists():
-            raise FileNotFoundError(f"Clip not found: {clip}")
-
-    output_path = Path(output_path).resolve()
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-
-    # Use UTF-8 so paths with non-ASCII characters (e.g., Japanese OneDrive folders)
-    # are written in a form ffmpeg understands on Windows.
-    with tempfile.NamedTemporaryFile(
-        mode="w", delete=False, suffix=".txt", encoding="utf-8"
-    ) as list_file:
-        for clip in clip_list:
-            list_file.write(_format_concat_line(clip))
-        list_file_path = Path(list_file.name)
-
-    try:
-        cmd = [
-            "ffmpeg",
-            "-y",
+        try:
+            os.stat(clip)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Clip not found: {clip}") from None
+
+    output_path = _fast_abs(Path(output_path))
+    ensure_dir(output_path.parent)
+
+    # Feed the list over stdin instead of a temp file. UTF-8 so paths with non-ASCII
+    # characters (e.g., Japanese OneDrive folders) are read correctly on Windows too.
+    list_data = "".join(_format_concat_line(clip) for clip in clip_list).encode("utf-8")
+
+    def _concat_cmd(codec_args: list[str]) -> list[str]:
+        # The whitelist lets the demuxer read its script from the pipe and the clips from disk.
+        return [
+            *FFMPEG_BASE_ARGS,
             "-f",
             "concat",
             "-safe",
             "0",
+            "-protocol_whitelist",
+            "file,pipe",
             "-i",
-            str(list_file_path),
-            "-c",
-            "copy",
+            "pipe:0",
+            *codec_args,
             str(output_path),
         ]
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        if result.returncode != 0 and reencode_on_failure:
-            # Fallback: re-encode to a uniform codec to handle mixed inputs.
-            cmd = [
-                "ffmpeg",
-                "-y",
-                "-f",
-                "concat",
-                "-safe",
-                "0",
-                "-i",
-                str(list_file_path),
-                "-c:v",
-                "libx264",
-                "-c:a",
-                "aac",
-                "-movflags",
-                "+faststart",
-                str(output_path),
-            ]
-            result = subprocess.run(cmd, capture_output=True, text=True)
-        if result.returncode != 0:
-            raise RuntimeError(f"ffmpeg concat failed: {result.stderr}")
-    finally:
-        list_file_path.unlink(missing_ok=True)
+
+    # Veo segments share codec/resolution/fps, so a stream copy is the normal path. +faststart
+    # puts the index up front so the browser player can start before the whole file arrives.
+    result = _run_ffmpeg(_concat_cmd(["-c", "copy", "-movflags", "+faststart"]), input=list_data)
+    if result.returncode != 0 and reencode_on_failure:
+        # Fallback: re-encode to a uniform codec to handle mixed inputs.
+        result = _run_ffmpeg(
+            _concat_cmd(["-c:v", "libx264", "-c:a", "aac", "-movflags", "+faststart"]),
+            input=list_data,
+        )
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg concat failed: {_stderr_text(result)}")
     return str(output_path)
@@ -1,35 +1,66 @@
 from __future__ import annotations
 
+import functools
+import hashlib
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Optional, Sequence, Union
+from typing import Callable, Dict, Optional, Sequence, Union
 
-try:
-    from google.genai import types  # type: ignore
-except ImportError:  # pragma: no cover - handled at call time
-    types = None
+from . import _genai_common
+from ._genai_common import is_fake_mode as _is_fake_mode
+from ._genai_common import types
+from .config import PipelineConfig, get_default_config, get_genai_client
+from .io_utils import atomic_write_bytes, ensure_dir, read_bytes_cached
 
-from .config import PipelineConfig, get_default_config, get_genai_client, use_fake_genai
-from .fake_genai import is_fake_client
 
+_INLINE_KEYS = ("inline_data", "inlineData")
+_IMAGE_LIST_KEYS = ("images", "generated_images", "generatedImages")
 
-def _guess_mime_type(path: Path) -> str:
-    suffix = path.suffix.lower()
-    if suffix in {".jpg", ".jpeg"}:
-        return "image/jpeg"
-    return "image/png"
 
-
-def _is_fake_mode(client) -> bool:
-    return use_fake_genai() or is_fake_client(client)
+def _inline_from_dict(container: dict) -> Optional[bytes]:
+    for key in _INLINE_KEYS:
+        inline = container.get(key)
+        if inline:
+            return inline.get("data") if isinstance(inline, dict) else None
+    return None
 
 
-def _require_types(fake_mode: bool):
-    if fake_mode:
-        return
-    if types is None:
-        raise ImportError(
-            "google-genai is required for image generation. Install dependencies from requirements.txt."
-        )
+def _extract_from_sdk(response) -> Optional[bytes]:
+    parts = getattr(response, "parts", None)
+    if not parts:
+        for candidate in getattr(response, "candidates", None) or []:
+            parts = getattr(getattr(candidate, "content", None), "parts", None)
+            if parts:
+                break
+    for part in parts or []:
+        inline_data = getattr(part, "inline_data", None)
+        if inline_data and getattr(inline_data, "data", None) is not None:
+            return inline_data.data
+    return None
+
+
+def _extract_from_dict(response: dict) -> Optional[bytes]:
+    data = _inline_from_dict(response)
+    if data:
+        return data
+    for cand in response.get("candidates", []) or []:
+        content = cand.get("content") or {}
+        for part in content.get("parts", []) or []:
+            if isinstance(part, dict):
+                data = _inline_from_dict(part)
+                if data:
+                    return data
+    for key in _IMAGE_LIST_KEYS:
+        imgs = response.get(key)
+        if imgs and isinstance(imgs, list):
+            first = imgs[0]
+            if isinstance(first, (bytes, bytearray)):
+                return bytes(first)
+            if isinstance(first, dict) and first.get("data"):
+                return first["data"]
+    return None
 
 
 def _extract_image_bytes(response) -> bytes:
@@ -37,55 +68,17 @@ def _extract_image_bytes(response) -> bytes:
     Attempt to pull inline image bytes from various google-genai response shapes.
     Falls back to common dict representations as well.
     """
-    # Direct bytes
     if isinstance(response, (bytes, bytearray)):
-        return response
-
-    # Attributes-based (SDK objects)
-    parts = getattr(response, "parts", None)
-    if not parts:
-        candidates = getattr(response, "candidates", []) or []
-        for candidate in candidates:
-            content = getattr(candidate, "content", None)
-            parts = getattr(content, "parts", None)
-            if parts:
-                break
-    if parts:
-        for part in parts:
-            inline_data = getattr(part, "inline_data", None)
-            if inline_data and getattr(inline_data, "data", None) is not None:
-                return inline_data.data
-
-    # Dict-based responses
+        return bytes(response)
+    # Dispatch once on the response kind instead of probing both shapes on every call.
     if isinstance(response, dict):
-        # direct inline_data
-        inline = response.get("inline_data") or response.get("inlineData")
-        if inline:
-            data = inline.get("data") if isinstance(inline, dict) else None
-            if data:
-                return data
-        # candidates path
-        for cand in response.get("candidates", []) or []:
-            content = cand.get("content") or {}
-            for part in content.get("parts", []) or []:
-                if isinstance(part, dict):
-                    inline = part.get("inline_data") or part.get("inlineData")
-                    if inline:
-                        data = inline.get("data") if isinstance(inline, dict) else None
-                        if data:
-                            return data
-        # generated_images style
-        for key in ("images", "generated_images", "generatedImages"):
-            imgs = response.get(key)
-            if imgs and isinstance(imgs, list):
-                first = imgs[0]
-                if isinstance(first, (bytes, bytearray)):
-                    return first
-                if isinstance(first, dict):
-                    data = first.get("data")
-                    if data:
-                        return data
+        data = _extract_from_dict(response)
+    else:
+        data = _extract_from_sdk(response)
+    if data is not None:
+        return data
 
+    # Only build the (expensive) key listing for the error message.
     debug_keys = []
     if isinstance(response, dict):
         debug_keys = list(response.keys())
@@ -97,16 +90,44 @@ def _extract_image_bytes(response) -> bytes:
     )
 
 
+_DEFAULT_CHANGE = sys.intern("incremental change from previous frame")
+# Prompts are re-used across regenerations; interning short ones makes repeat cache-key
+# comparisons identity checks without letting arbitrarily long text into the intern table.
+_INTERN_MAX_LEN = 4096
+
+
+def _intern(text: str) -> str:
+    return sys.intern(text) if len(text) < _INTERN_MAX_LEN else text
+
+
 def _compose_image_prompt(frame: dict) -> str:
     """
     Use the frame prompt provided by the user (minimal additions).
     Fallback to change_from_previous if prompt text is missing.
     """
-    base_prompt = frame.get("prompt") or ""
+    base_prompt = frame.get("prompt")
     if base_prompt:
-        return base_prompt
+        return _intern(base_prompt)
     change = frame.get("change_from_previous")
-    return change or "incremental change from previous frame"
+    return _intern(change) if change else _DEFAULT_CHANGE
+
+
+@functools.lru_cache(maxsize=32)
+def _ref_part(data: bytes, mime: str):
+    """
+    Wrap reference bytes as a ``types.Part`` once.
+
+    Each frame re-sends every earlier frame as a reference, so the same bytes objects come back on
+    every call of a run; bytes cache their hash, making repeat lookups cheap.
+    """
+    return types.Part.from_bytes(data=data, mime_type=mime)
+
+
+def _is_retriable(exc: Exception) -> bool:
+    """Server-side failures, rate limits and image-less responses are worth one more try."""
+    if isinstance(exc, ValueError):  # response came back without image bytes
+        return True
+    return _genai_common.is_transient_api_error(exc)
 
 
 def _generate_image_bytes(
@@ -118,39 +139,92 @@ def _generate_image_bytes(
     max_attempts: int = 2,
 ) -> bytes:
     fake_mode = _is_fake_mode(client)
-    _require_types(fake_mode)
+    _genai_common.require_types(fake_mode, purpose="image generation")
     contents = []
     for ref in ref_images or []:
         ref_bytes, mime = (ref, "image/png") if isinstance(ref, (bytes, bytearray)) else ref
         if fake_mode:
             contents.append(ref_bytes)
         else:
-            contents.append(types.Part.from_bytes(data=ref_bytes, mime_type=mime))
+            contents.append(_ref_part(bytes(ref_bytes), mime))
     contents.append(prompt_text)
-    modality = None
-    if not fake_mode and hasattr(types, "Modality"):
-        modality = types.Modality.IMAGE
 
-    last_exc: Exception | None = None
-    for _ in range(max_attempts):
+    if fake_mode:
+        # The fake client is deterministic and never fails transiently.
+        response = client.models.generate_content(model=cfg.image_model, contents=contents, config=None)
+        return _extract_image_bytes(response)
+
+    modality = types.Modality.IMAGE if hasattr(types, "Modality") else "IMAGE"
+    request_config = types.GenerateContentConfig(
+        response_modalities=[modality],
+        image_config=types.ImageConfig(aspect_ratio=cfg.aspect_ratio),
+    )
+    for attempt in range(max_attempts):
         try:
             response = client.models.generate_content(
                 model=cfg.image_model,
                 contents=contents,
-                config=None
-                if fake_mode
-                else types.GenerateContentConfig(
-                    response_modalities=[modality] if modality else ["IMAGE"],
-                    image_config=types.ImageConfig(aspect_ratio=cfg.aspect_ratio),
-                ),
+                config=request_config,
             )
             return _extract_image_bytes(response)
         except Exception as exc:  # noqa: BLE001
-            last_exc = exc
-            continue
+            if attempt == max_attempts - 1 or not _is_retriable(exc):
+                raise
+            time.sleep(0.5 * 2**attempt)
+    raise RuntimeError("max_attempts must be at least 1")
+
 
-    assert last_exc is not None
-    raise last_exc
+def _read_files(paths: Sequence[Path]) -> list[bytes]:
+    """Read several files concurrently, preserving order."""
+    if len(paths) < 2:
+        return [read_bytes_cached(path) for path in paths]
+    with ThreadPoolExecutor(max_workers=min(8, len(paths))) as pool:
+        return list(pool.map(read_bytes_cached, paths))
+
+
+# Bump when request construction changes so stale cached images stop matching.
+_IMAGE_CACHE_VERSION = b"v1"
+
+
+def _image_cache_key(
+    prompt_text: str, ref_digests: Sequence[bytes], cfg: PipelineConfig, fake_mode: bool = False
+) -> str:
+    """
+    Hash everything that determines an image: model, aspect ratio, prompt and every reference.
+    Fake and real images never share a key, since the cache directory may be shared between runs.
+    """
+    hasher = hashlib.sha256(_IMAGE_CACHE_VERSION)
+    for field in (cfg.image_model, cfg.aspect_ratio, prompt_text, "fake" if fake_mode else "real"):
+        hasher.update(field.encode("utf-8"))
+        hasher.update(b"\0")
+    for digest in ref_digests:
+        hasher.update(digest)
+    return hasher.hexdigest()
+
+
+def _generate_image_bytes_cached(
+    prompt_text: str,
+    ref_images: Optional[Sequence[Union[bytes, tuple[bytes, str]]]],
+    *,
+    client,
+    cfg: PipelineConfig,
+    cache_dir: Optional[Path],
+    ref_digests: Sequence[bytes] = (),
+) -> bytes:
+    """
+    Serve identical requests from ``cache_dir`` when given; otherwise call the image model.
+    ``ref_digests`` are the sha256 digests of ``ref_images``, computed once by the caller.
+    """
+    if cache_dir is None:
+        return _generate_image_bytes(prompt_text, ref_images, client=client, cfg=cfg)
+    key = _image_cache_key(prompt_text, ref_digests, cfg, _is_fake_mode(client))
+    cache_path = Path(cache_dir) / f"{key}.png"
+    if cache_path.exists():
+        return cache_path.read_bytes()
+    image_bytes = _generate_image_bytes(prompt_text, ref_images, client=client, cfg=cfg)
+    ensure_dir(cache_path.parent)
+    atomic_write_bytes(cache_path, image_bytes)
+    return image_bytes
 
 
 def generate_storyboard_images(
@@ -160,10 +234,13 @@ def generate_storyboard_images(
     *,
     client=None,
     config: Optional[PipelineConfig] = None,
+    cache_dir: Optional[Union[Path, str]] = None,
 ) -> Dict[str, str]:
     """
     Generate storyboard images for each frame prompt.
     Returns a mapping of frame_id -> saved image path (as string).
+    When ``cache_dir`` is given, frames whose prompt, model and references match an earlier
+    request are served from it instead of calling the image model.
     """
     cfg = config or get_default_config()
     genai_client = client or get_genai_client()
@@ -173,10 +250,13 @@ def generate_storyboard_images(
 
     reference_images: list[bytes] = []
     if ref_image_path:
-        ref_path = Path(ref_image_path)
-        reference_images.append(ref_path.read_bytes())
+        reference_images.append(read_bytes_cached(Path(ref_image_path)))
 
     generated_images: list[bytes] = []
+    cache_root = Path(cache_dir) if cache_dir else None
+    anchor_digests: list[bytes] = (
+        [hashlib.sha256(img).digest() for img in reference_images] if cache_root else []
+    )
 
     frame_paths: Dict[str, str] = {}
     frames = prompts_data.get("frames", [])
@@ -184,16 +264,20 @@ def generate_storyboard_images(
         frame_id = frame.get("id") or "X"
         prompt_text = _compose_image_prompt(frame)
         ref_list = list(reference_images) + list(generated_images)
-        image_bytes = _generate_image_bytes(
+        image_bytes = _generate_image_bytes_cached(
             prompt_text,
             ref_list,
             client=genai_client,
             cfg=cfg,
+            cache_dir=cache_root,
+            ref_digests=anchor_digests,
         )
         image_path = frames_dir / f"frame_{frame_id}.png"
         image_path.write_bytes(image_bytes)
         frame_paths[frame_id] = str(image_path)
         generated_images.append(image_bytes)
+        if cache_root:
+            anchor_digests.append(hashlib.sha256(image_bytes).digest())
     return frame_paths
 
 
@@ -206,12 +290,18 @@ def regenerate_storyboard_images(
     *,
     client=None,
     config: Optional[PipelineConfig] = None,
+    on_frame_done: Optional[Callable[[str, str], None]] = None,
+    cache_dir: Optional[Union[Path, str]] = None,
 ) -> Dict[str, str]:
     """
     Regenerate (or generate if missing) only the specified frame IDs while keeping other frames intact.
 
     The regeneration uses all prior frames (plus the optional reference image for
-    frame A) as stylistic anchors to maintain consistency.
+    frame A) as stylistic anchors to maintain consistency, so frames are generated
+    in order. ``on_frame_done(frame_id, path)`` is called as soon as each frame is
+    written so callers can surface results progressively. When ``cache_dir`` is
+    given, a frame whose prompt, model and reference images are unchanged is
+    served from that directory instead of calling the image model again.
     """
 
     cfg = config or get_default_config()
@@ -222,33 +312,52 @@ def regenerate_storyboard_images(
     target_ids = set(frame_ids)
     reference_images: list[bytes] = []
     if ref_image_path:
-        ref_path = Path(ref_image_path)
-        reference_images.append(ref_path.read_bytes())
+        reference_images.append(read_bytes_cached(Path(ref_image_path)))
 
     generated_images: list[bytes] = []
+    # Digest each anchor once per call; cache keys reuse them instead of re-hashing per frame.
+    cache_root = Path(cache_dir) if cache_dir else None
+    anchor_digests: list[bytes] = (
+        [hashlib.sha256(img).digest() for img in reference_images] if cache_root else []
+    )
 
-    updated_paths = dict(frame_image_paths)
-    frames = prompts_data.get("frames", [])
-    for frame in frames:
+    # Every frame in prompts_data is visited below, so the result is built from scratch
+    # rather than copied; entries for frames no longer in prompts_data are dropped.
+    updated_paths: Dict[str, str] = {}
+    plan: list[tuple[dict, str, Path, bool]] = []
+    for frame in prompts_data.get("frames", []):
         frame_id = frame.get("id") or "X"
-        existing_path = Path(frame_image_paths.get(frame_id, frames_dir / f"frame_{frame_id}.png"))
-        needs_generate = frame_id in target_ids or not existing_path.exists()
+        # Treat empty placeholders (left by frame reindexing) like missing paths.
+        existing_path = Path(frame_image_paths.get(frame_id) or frames_dir / f"frame_{frame_id}.png")
+        needs_generate = frame_id in target_ids or not existing_path.is_file()
+        plan.append((frame, frame_id, existing_path, needs_generate))
+
+    # Generation must stay sequential (each frame anchors on the ones before it), but frames
+    # that are kept only contribute their bytes, so read those concurrently up front.
+    kept_bytes = iter(_read_files([path for _, _, path, regen in plan if not regen]))
 
+    for frame, frame_id, existing_path, needs_generate in plan:
         if needs_generate:
             prompt_text = _compose_image_prompt(frame)
             ref_list = list(reference_images) + list(generated_images)
-            image_bytes = _generate_image_bytes(
+            image_bytes = _generate_image_bytes_cached(
                 prompt_text,
                 ref_list,
                 client=genai_client,
                 cfg=cfg,
+                cache_dir=cache_root,
+                ref_digests=anchor_digests,
             )
-            existing_path.parent.mkdir(parents=True, exist_ok=True)
+            ensure_dir(existing_path.parent)
             existing_path.write_bytes(image_bytes)
+            if on_frame_done is not None:
+                on_frame_done(frame_id, str(existing_path))
         else:
-            image_bytes = existing_path.read_bytes()
+            image_bytes = next(kept_bytes)
 
         updated_paths[frame_id] = str(existing_path)
         generated_images.append(image_bytes)
+        if cache_root:
+            anchor_digests.append(hashlib.sha256(image_bytes).digest())
 
     return updated_paths
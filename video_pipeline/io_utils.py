@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import functools
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional, Union
+
+# Copy uploads in 1 MiB chunks so peak memory stays at one chunk, not the whole file.
+COPY_CHUNK_SIZE = 1 << 20
+
+
+_ENSURED_DIRS: set[str] = set()
+_ENSURED_DIRS_LOCK = threading.Lock()
+
+
+def ensure_dir(path: Union[str, Path]) -> None:
+    """
+    ``mkdir(parents=True, exist_ok=True)`` that remembers directories it already created.
+
+    Per-frame and per-segment writes go to the same few directories, so repeat calls are a set
+    lookup instead of a stat per path component. Directories removed out from under a running
+    process are not noticed; call ``Path.mkdir`` directly where that matters.
+    """
+    key = str(path)
+    if key in _ENSURED_DIRS:
+        return
+    with _ENSURED_DIRS_LOCK:
+        Path(path).mkdir(parents=True, exist_ok=True)
+        _ENSURED_DIRS.add(key)
+
+
+@functools.lru_cache(maxsize=64)
+def _cached_file_bytes(path: str, mtime_ns: int, size: int) -> bytes:
+    return Path(path).read_bytes()
+
+
+def read_bytes_cached(path: Union[str, Path]) -> bytes:
+    """
+    Read ``path`` through a small in-process cache.
+
+    Keyed on path, mtime and size, so a rewritten file (e.g. a regenerated frame) is read again.
+    """
+    stat = os.stat(path)
+    return _cached_file_bytes(str(path), stat.st_mtime_ns, stat.st_size)
+
+
+def _replace_via_temp(path: Path, write) -> None:
+    """Run ``write(tmp_path)`` on a sibling temp file, then move it over ``path`` in one rename."""
+    fd, tmp_name = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".part", dir=path.parent)
+    os.close(fd)
+    try:
+        write(tmp_name)
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+def atomic_write_bytes(path: Union[str, Path], data: bytes) -> None:
+    """
+    Write ``data`` to ``path`` so readers see either the old file or the complete new one.
+
+    Cache entries are trusted on existence alone, so an interrupted write must never leave a
+    truncated file under the final name.
+    """
+    _replace_via_temp(Path(path), lambda tmp: Path(tmp).write_bytes(data))
+
+
+def atomic_copy(src: Union[str, Path], dst: Union[str, Path]) -> None:
+    """``shutil.copyfile`` (kernel-side copy on Linux/macOS) with the same all-or-nothing guarantee."""
+    _replace_via_temp(Path(dst), lambda tmp: shutil.copyfile(src, tmp))
+
+
+def _iter_upload_chunks(upload: BinaryIO) -> Iterator[Union[bytes, memoryview]]:
+    """
+    Yield the remaining upload contents in ``COPY_CHUNK_SIZE`` pieces.
+
+    In-memory uploads (``io.BytesIO``, which Streamlit's ``UploadedFile`` subclasses) are sliced
+    through ``getbuffer()`` so chunks are views, not copies; other file objects fall back to
+    ``read()``.
+    """
+    getbuffer = getattr(upload, "getbuffer", None)
+    if getbuffer is not None:
+        start = upload.tell()
+        with getbuffer() as view:
+            for offset in range(start, len(view), COPY_CHUNK_SIZE):
+                yield view[offset : offset + COPY_CHUNK_SIZE]
+        upload.seek(0, os.SEEK_END)
+        return
+    while chunk := upload.read(COPY_CHUNK_SIZE):
+        yield chunk
+
+
+def save_uploaded_file(
+    upload: BinaryIO,
+    *,
+    prefix: str = "ref_image_",
+    dest_dir: Optional[Union[str, Path]] = None,
+) -> Path:
+    """
+    Stream a named file-like upload (e.g. Streamlit's ``UploadedFile``) to a content-addressed file.
+
+    The upload is hashed while it is copied, and the result is stored as
+    ``<dest_dir>/<prefix><digest><suffix>`` (``dest_dir`` defaults to the system temp dir).
+    Re-uploading the same image returns the existing file instead of writing a new copy.
+    The original suffix is kept (defaulting to ``.png``) so MIME detection downstream still works.
+    """
+    suffix = Path(upload.name).suffix or ".png"
+    root = Path(dest_dir) if dest_dir is not None else Path(tempfile.gettempdir())
+    root.mkdir(parents=True, exist_ok=True)
+
+    hasher = hashlib.blake2b(digest_size=16)
+    fd, tmp_name = tempfile.mkstemp(prefix=prefix, suffix=".part", dir=root)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for chunk in _iter_upload_chunks(upload):
+                hasher.update(chunk)
+                out.write(chunk)
+        target = root / f"{prefix}{hasher.hexdigest()}{suffix}"
+        if target.exists():
+            os.unlink(tmp_name)
+        else:
+            os.replace(tmp_name, target)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+    return target
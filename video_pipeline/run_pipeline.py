@@ -1,13 +1,17 @@
 from __future__ import annotations
 
+import logging
+import threading
 from pathlib import Path
-from typing import Optional, Union
+from typing import Callable, Optional, Union
 
 from . import ffmpeg_utils
-from .config import PipelineConfig, get_default_config, make_run_directory
+from .config import PipelineConfig, get_default_config, get_genai_client, make_run_directory
 from .images import generate_storyboard_images
 from .videos import generate_all_segments
 
+logger = logging.getLogger(__name__)
+
 
 def build_video_from_frames(
     run_dir: Path,
@@ -16,8 +20,14 @@ def build_video_from_frames(
     *,
     client=None,
     config: Optional[PipelineConfig] = None,
+    on_segment_done: Optional[Callable[[int, int], None]] = None,
+    cancel_event: Optional[threading.Event] = None,
+    use_cache: bool = True,
 ) -> str:
-    """Generate Veo segments and concatenate them into final.mp4."""
+    """
+    Generate Veo segments and concatenate them into final.mp4.
+    ``use_cache=False`` asks Veo for fresh clips even when cached ones match.
+    """
     cfg = config or get_default_config()
 
     clip_paths = generate_all_segments(
@@ -26,6 +36,9 @@ def build_video_from_frames(
         run_dir,
         client=client,
         config=cfg,
+        on_segment_done=on_segment_done,
+        cancel_event=cancel_event,
+        use_cache=use_cache,
     )
 
     final_video_path = Path(run_dir) / "final.mp4"
@@ -45,24 +58,26 @@ def run_pipeline(
     Returns the path to the final video file.
     """
     cfg = config or get_default_config()
+    # Resolve the client once so the image and video stages share it instead of each building one.
+    genai_client = client or get_genai_client()
     run_dir = make_run_directory(cfg)
     prompts_data = {"frames": frames}
-    print(f"[pipeline] generating storyboard images for {len(frames)} frames")
+    logger.info("generating storyboard images for %d frames", len(frames))
     frame_image_paths = generate_storyboard_images(
         prompts_data,
         run_dir,
         ref_image_path=ref_image_path,
-        client=client,
+        client=genai_client,
         config=cfg,
     )
 
-    print("[pipeline] generating video segments")
+    logger.info("generating video segments")
     final_video_path = build_video_from_frames(
         run_dir,
         prompts_data,
         frame_image_paths,
-        client=client,
+        client=genai_client,
         config=cfg,
     )
-    print(f"[pipeline] done: {final_video_path}")
+    logger.info("done: %s", final_video_path)
     return str(final_video_path)
@@ -1,46 +1,39 @@
 from __future__ import annotations
 
+import hashlib
+import inspect
+import os
+import random
+import shutil
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional
 
-try:
-    from google.genai import types  # type: ignore
-except ImportError:  # pragma: no cover - handled at call time
-    types = None
-
-from .config import PipelineConfig, get_default_config, get_genai_client, use_fake_genai
-from .fake_genai import is_fake_client
+from . import _genai_common
+from ._genai_common import guess_mime_type as _guess_mime_type
+from ._genai_common import is_fake_mode as _is_fake_mode
+from ._genai_common import types
+from .config import PipelineConfig, get_default_config, get_genai_client
 from .ffmpeg_utils import extract_last_frame
+from .io_utils import atomic_copy, ensure_dir, read_bytes_cached
 
 
-def _guess_mime_type(path: Path) -> str:
-    suffix = path.suffix.lower()
-    if suffix in {".jpg", ".jpeg"}:
-        return "image/jpeg"
-    return "image/png"
-
+class GenerationCancelled(RuntimeError):
+    """Raised when segment generation is cancelled between segments."""
 
-def _is_fake_mode(client) -> bool:
-    return use_fake_genai() or is_fake_client(client)
 
-
-def _make_image_input(path: Path, *, client) -> Any:
-    if _is_fake_mode(client):
+def _make_image_input(path: Path, *, fake_mode: bool) -> Any:
+    if fake_mode:
         return path
-    _require_types(fake_mode=False)
     # Prefer inline bytes over file paths to avoid file-uri issues in Veo API.
-    data = Path(path).read_bytes()
+    data = read_bytes_cached(path)
     return types.Image(image_bytes=data, mime_type=_guess_mime_type(path))
 
 
 def _require_types(fake_mode: bool):
-    if fake_mode:
-        return
-    if types is None:
-        raise ImportError(
-            "google-genai is required for Veo video generation. Install dependencies from requirements.txt."
-        )
+    _genai_common.require_types(fake_mode, purpose="Veo video generation")
 
 
 def _extract_generated_videos(operation, response):
@@ -63,6 +56,91 @@ def _extract_generated_videos(operation, response):
     return None
 
 
+def _response_fields(response) -> list[str]:
+    """
+    Field names for the error message, read from the instance only. Listing the class via
+    dir() mostly adds model methods, and can trigger lazy descriptors on SDK objects.
+    """
+    if isinstance(response, dict):
+        return list(response.keys())
+    if response is None:
+        return []
+    fields = getattr(response, "__dict__", None)
+    if fields is None:
+        return [type(response).__name__]
+    return [key for key in fields if not key.startswith("_")]
+
+
+def _accepts_destination(download) -> bool:
+    """Whether this google-genai ``files.download`` can stream to a path (decided from its signature)."""
+    try:
+        return "destination" in inspect.signature(download).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+def _download_video(client, video, output_path: Path) -> None:
+    """
+    Stream a generated clip straight to ``output_path``.
+
+    Newer google-genai releases write to ``destination`` in chunks; older ones only return bytes.
+    Either way the clip lands in a ``.part`` file first and is renamed into place once complete,
+    so an interrupted download never leaves a truncated clip under the final name.
+    """
+    partial = output_path.with_name(output_path.name + ".part")
+    download = client.files.download
+    try:
+        if _accepts_destination(download):
+            data = download(file=video, destination=str(partial))
+        else:
+            data = download(file=video)
+        if data is not None:
+            partial.write_bytes(data)
+        os.replace(partial, output_path)
+    except BaseException:
+        partial.unlink(missing_ok=True)
+        raise
+
+
+def _segment_cache_key(
+    start_image: Path, end_image: Path, motion_description: str, cfg: PipelineConfig, fake_mode: bool
+) -> str:
+    """Fingerprint everything that determines a segment; fake and real clips never share entries."""
+    hasher = hashlib.blake2b(digest_size=16)
+    for image in (start_image, end_image):
+        hasher.update(hashlib.blake2b(read_bytes_cached(image), digest_size=16).digest())
+    for field in (
+        motion_description,
+        cfg.video_model,
+        cfg.aspect_ratio,
+        str(cfg.segment_duration_seconds),
+        "fake" if fake_mode else "real",
+    ):
+        hasher.update(field.encode("utf-8"))
+        hasher.update(b"\0")
+    return hasher.hexdigest()
+
+
+# Consecutive transient operations.get failures tolerated before a segment gives up.
+_MAX_POLL_FAILURES = 5
+
+
+def _poll_delays(cfg: PipelineConfig) -> Iterator[float]:
+    """Endless poll intervals: exponential (x1.5) with jitter from the initial delay, never above the cap."""
+    delay = cfg.poll_initial_seconds
+    while True:
+        yield delay
+        delay = min(delay * 1.5 + random.uniform(0, 0.25), cfg.poll_max_seconds)
+
+
+_SEGMENT_PROMPT_PREFIX = (
+    "Create a short, smooth video segment that starts from the first frame and moves toward the second frame. "
+    "Maintain the same character, art style, camera framing, lighting, and world details across the segment. "
+    "Motion description: "
+)
+_DEFAULT_MOTION = "natural, subtle motion continuing the scene."
+
+
 def generate_segment_for_pair(
     frame1_path: Path,
     frame2_path: Path,
@@ -71,58 +149,70 @@ def generate_segment_for_pair(
     *,
     client=None,
     config: Optional[PipelineConfig] = None,
+    fake_mode: Optional[bool] = None,
 ) -> str:
     cfg = config or get_default_config()
     genai_client = client or get_genai_client()
     output_path = Path(output_path)
-    output_path.parent.mkdir(parents=True, exist_ok=True)
+    ensure_dir(output_path.parent)
 
-    fake_mode = _is_fake_mode(genai_client)
+    if fake_mode is None:
+        fake_mode = _is_fake_mode(genai_client)
+    _require_types(fake_mode)
 
-    prompt_text = (
-        "Create a short, smooth video segment that starts from the first frame and moves toward the second frame. "
-        "Maintain the same character, art style, camera framing, lighting, and world details across the segment. "
-        f"Motion description: {motion_description or 'natural, subtle motion continuing the scene.'}"
-    )
+    prompt_text = _SEGMENT_PROMPT_PREFIX + (motion_description or _DEFAULT_MOTION)
 
     duration_seconds = cfg.segment_duration_seconds
     # Veo interpolation only supports 8-second clips in real mode.
     if not fake_mode and duration_seconds != 8:
         duration_seconds = 8
 
+    # Built once; a retry re-sends the same inputs.
+    first_image = _make_image_input(frame1_path, fake_mode=fake_mode)
+    last_image = _make_image_input(frame2_path, fake_mode=fake_mode)
+
     def _request_operation():
         if fake_mode:
             return genai_client.models.generate_videos(
                 model=cfg.video_model,
                 prompt=prompt_text,
-                image=_make_image_input(frame1_path, client=genai_client),
+                image=first_image,
                 config={
                     "aspect_ratio": cfg.aspect_ratio,
                     "duration_seconds": duration_seconds,
-                    "last_frame": _make_image_input(frame2_path, client=genai_client),
+                    "last_frame": last_image,
                 },
             )
-        _require_types(fake_mode)
         return genai_client.models.generate_videos(
             model=cfg.video_model,
             prompt=prompt_text,
-            image=_make_image_input(frame1_path, client=genai_client),
+            image=first_image,
             config=types.GenerateVideosConfig(
                 aspect_ratio=cfg.aspect_ratio,
                 duration_seconds=duration_seconds,
-                last_frame=_make_image_input(frame2_path, client=genai_client),
+                last_frame=last_image,
             ),
         )
 
     max_attempts = 2
-    last_response_debug: list[str] = []
 
     for attempt in range(max_attempts):
         operation = _request_operation()
 
-        while not getattr(operation, "done", False):
-            time.sleep(5)
-            operation = genai_client.operations.get(operation)
+        poll_failures = 0
+        for delay in _poll_delays(cfg):
+            if getattr(operation, "done", False):
+                break
+            time.sleep(delay)
+            try:
+                operation = genai_client.operations.get(operation)
+            except Exception as exc:  # noqa: BLE001
+                # A blip while polling must not throw away a job that is still running server-side.
+                poll_failures += 1
+                if fake_mode or poll_failures > _MAX_POLL_FAILURES or not _genai_common.is_transient_api_error(exc):
+                    raise
+                continue
+            poll_failures = 0
 
         op_error = getattr(operation, "error", None)
         if op_error is None and isinstance(operation, dict):
@@ -140,22 +230,16 @@ def generate_segment_for_pair(
         generated_videos = _extract_generated_videos(operation, response)
         if generated_videos:
             video_obj = generated_videos[0]
-            data = genai_client.files.download(file=video_obj.video)
-            Path(output_path).write_bytes(data)
+            _download_video(genai_client, video_obj.video, output_path)
             return str(output_path)
 
-        if isinstance(response, dict):
-            last_response_debug = list(response.keys())
-        elif response is not None:
-            last_response_debug = [attr for attr in dir(response) if not attr.startswith("_")]
-
         if attempt < max_attempts - 1:
             time.sleep(3)
             continue
 
         raise RuntimeError(
             "Video generation operation completed but did not return generated_videos "
-            f"(available fields: {last_response_debug})"
+            f"(available fields: {_response_fields(response)})"
         )
 
     raise RuntimeError("Video generation failed after retries.")
@@ -168,11 +252,27 @@ def generate_all_segments(
     *,
     client=None,
     config: Optional[PipelineConfig] = None,
+    on_segment_done: Optional[Callable[[int, int], None]] = None,
+    cancel_event: Optional[threading.Event] = None,
+    use_cache: bool = True,
 ) -> List[str]:
+    """
+    Generate one Veo segment per consecutive frame pair, chaining each segment from the
+    previous segment's last frame. ``on_segment_done(done, total)`` reports progress and
+    setting ``cancel_event`` stops the run before the next segment is requested.
+
+    Finished clips and their extracted last frames are kept under ``segments/.cache`` keyed by
+    their inputs, so resuming an interrupted build, or rebuilding after only later frames
+    changed, skips both the Veo call and ffmpeg for unchanged leading segments. With
+    ``use_cache=False`` every segment is generated again and the fresh clips replace the
+    cached ones; Veo is non-deterministic, so this is how a rebuild gets new variations.
+    """
     cfg = config or get_default_config()
     genai_client = client or get_genai_client()
+    fake_mode = _is_fake_mode(genai_client)
     segments_dir = Path(output_dir) / "segments"
-    segments_dir.mkdir(parents=True, exist_ok=True)
+    ensure_dir(segments_dir)
+    cache_dir = segments_dir / ".cache"
 
     frames = prompts_data.get("frames", [])
     if len(frames) < 2:
@@ -186,27 +286,57 @@ def generate_all_segments(
     except KeyError as exc:
         raise KeyError(f"frame_image_paths is missing image for first frame id={first_id}") from exc
 
-    for idx in range(len(frames) - 1):
-        second = frames[idx + 1]
-        second_id = second.get("id") or f"F{idx+1}"
+    # Resolve every end frame up front so a missing image fails before any Veo call is made.
+    schedule = []
+    for idx, second in enumerate(frames[1:], start=1):
+        second_id = second.get("id") or f"F{idx}"
         try:
             second_path = Path(frame_image_paths[second_id])
         except KeyError as exc:
             raise KeyError(f"frame_image_paths is missing image for frame id={second_id}") from exc
-        motion_description = second.get("change_from_previous") or "smooth continuation"
-        segment_path = segments_dir / f"segment_{idx:03d}_{first_id}_{second_id}.mp4"
-
-        generated = generate_segment_for_pair(
-            current_start_image,
-            second_path,
-            motion_description,
-            segment_path,
-            client=genai_client,
-            config=cfg,
-        )
-        clip_paths.append(generated)
-
-        last_frame_image = segments_dir / f"segment_{idx:03d}_{first_id}_{second_id}_last.png"
-        current_start_image = extract_last_frame(Path(generated), last_frame_image)
-        first_id = second_id
+        schedule.append((second_id, second_path, second.get("change_from_previous") or "smooth continuation"))
+
+    total_segments = len(schedule)
+    # A failed prefetch is simply dropped; the real read surfaces any error.
+    with ThreadPoolExecutor(max_workers=1) as prefetcher:
+        for idx, (second_id, second_path, motion_description) in enumerate(schedule):
+            if cancel_event is not None and cancel_event.is_set():
+                raise GenerationCancelled(f"Video generation cancelled after {idx} of {total_segments} segments.")
+            if idx + 1 < total_segments:
+                # Warm the read cache with the next segment's end frame while this segment is in flight.
+                prefetcher.submit(read_bytes_cached, schedule[idx + 1][1])
+            segment_path = segments_dir / f"segment_{idx:03d}_{first_id}_{second_id}.mp4"
+
+            cache_key = _segment_cache_key(current_start_image, second_path, motion_description, cfg, fake_mode)
+            cached_clip = cache_dir / f"{cache_key}.mp4"
+            cached_last_frame = cache_dir / f"{cache_key}_last.png"
+            from_cache = use_cache and cached_clip.is_file()
+            if from_cache:
+                shutil.copyfile(cached_clip, segment_path)
+                generated = str(segment_path)
+            else:
+                generated = generate_segment_for_pair(
+                    current_start_image,
+                    second_path,
+                    motion_description,
+                    segment_path,
+                    client=genai_client,
+                    config=cfg,
+                    fake_mode=fake_mode,
+                )
+                ensure_dir(cache_dir)
+                atomic_copy(generated, cached_clip)
+            clip_paths.append(generated)
+
+            last_frame_image = segments_dir / f"segment_{idx:03d}_{first_id}_{second_id}_last.png"
+            # Only a cached clip may reuse a cached last frame; a fresh clip has its own.
+            if from_cache and cached_last_frame.is_file():
+                shutil.copyfile(cached_last_frame, last_frame_image)
+                current_start_image = last_frame_image
+            else:
+                current_start_image = extract_last_frame(Path(generated), last_frame_image)
+                atomic_copy(current_start_image, cached_last_frame)
+            first_id = second_id
+            if on_segment_done is not None:
+                on_segment_done(idx + 1, total_segments)
     return clip_paths